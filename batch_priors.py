@@ -0,0 +1,81 @@
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+import communityprior
+import communityprior_pertopic
+import membership
+
+# Estimate flat and per-topic priors for many covers of the same network.
+# The dictionary is loaded once, worker processes inherit it when forked.
+# Outputs are named as the LDA scripts expect:
+#   <out_prefix>-<method>-alpha.csv, <out_prefix>-<method>-beta.csv,
+#   <out_prefix>-<method>-alpha-pertopic.csv, <out_prefix>-<method>-beta-pertopic.npy
+
+id_to_index = None
+
+def parse_cover(arg):
+    '''A cover is given as method=path, or as a path named after its method.'''
+    if "=" in arg:
+        method, path = arg.split("=", 1)
+    else:
+        path = arg
+        method = os.path.splitext(os.path.basename(arg))[0]
+    return (method, path)
+
+def estimate_cover(task):
+    method, cover_file, out_prefix, chunk_rows = task
+    start = time.time()
+    prefix = "%s-%s" % (out_prefix, method)
+    if chunk_rows:
+        alpha, beta = communityprior.estimate_simple_stream(cover_file, id_to_index, chunk_rows)
+        communityprior.write_alpha(prefix + "-alpha.csv", alpha)
+        communityprior.write_beta(prefix + "-beta.csv", beta)
+        alpha, beta = communityprior_pertopic.estimate_simple_stream(cover_file, id_to_index, chunk_rows)
+    else:
+        com_data = membership.read_memberships(cover_file)
+        alpha, beta = communityprior.estimate_simple(com_data, id_to_index)
+        communityprior.write_alpha(prefix + "-alpha.csv", alpha)
+        communityprior.write_beta(prefix + "-beta.csv", beta)
+        alpha, beta = communityprior_pertopic.estimate_simple(com_data, id_to_index)
+    communityprior.write_alpha(prefix + "-alpha-pertopic.csv", alpha)
+    communityprior_pertopic.write_beta_binary(prefix + "-beta-pertopic.npy", beta)
+    return (method, time.time() - start, communityprior.peak_rss())
+
+def main(argv):
+    '''Estimate the priors of every cover in argv, return the methods in
+    the order they finished.
+    '''
+    global id_to_index
+    parser = argparse.ArgumentParser(description="Estimate priors for many covers of one network")
+    parser.add_argument("dict_file", help="csv of node_index,node_id")
+    parser.add_argument("out_prefix", help="e.g. output/priors/flickr")
+    parser.add_argument("covers", nargs="+", help="cover csv files, as path or method=path")
+    parser.add_argument("--processes", type=int, default=multiprocessing.cpu_count())
+    parser.add_argument("--chunk-rows", type=int, help="stream each cover in chunks of this many rows")
+    args = parser.parse_args(argv)
+
+    start = time.time()
+    print "Loading dictionary"
+    id_to_index = communityprior.get_id_to_index(args.dict_file)
+    tasks = [parse_cover(c) + (args.out_prefix, args.chunk_rows) for c in args.covers]
+    out_dir = os.path.dirname(args.out_prefix)
+    if out_dir and not os.path.isdir(out_dir):
+        os.makedirs(out_dir)
+
+    print "Estimating %d covers with %d processes" % (len(tasks), args.processes)
+    methods = []
+    pool = multiprocessing.Pool(min(args.processes, len(tasks)))
+    try:
+        for method, elapsed, rss in pool.imap_unordered(estimate_cover, tasks):
+            print "  %s: %.1f seconds, peak RSS %.1f MB" % (method, elapsed, rss)
+            methods.append(method)
+    finally:
+        pool.close()
+        pool.join()
+    print "Finished in %.1f seconds" % (time.time() - start)
+    return methods
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
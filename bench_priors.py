@@ -0,0 +1,173 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+import communityprior
+import communityprior_pertopic
+import membership
+import nodedict
+
+# Benchmark the prior estimators on synthetic overlapping covers.
+# Each cover is generated in a worker process and written as a binary cover,
+# then each run reads it in a fresh worker process, so its peak RSS is that
+# of loading the cover and estimating, not of generating it.
+# The report is json, one entry per (estimator, scale).
+
+example_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "examples")
+
+def synthetic_cover(num_nodes, num_coms, per_node, seed=0):
+    '''Cover where every node belongs to per_node distinct communities.
+    Community popularity is skewed so sizes vary as in real covers.
+    '''
+    rs = np.random.RandomState(seed)
+    per_node = min(per_node, num_coms)
+    popularity = 1.0 / np.arange(1, num_coms + 1)
+    popularity /= popularity.sum()
+    # Draw extra candidates per node and keep the first distinct ones
+    candidates = rs.choice(num_coms, size=(num_nodes, 4 * per_node), p=popularity)
+    node_id = []
+    com_id = []
+    for offset in range(0, num_nodes, 100000):
+        block = candidates[offset:offset + 100000]
+        nodes = np.repeat(np.arange(offset, offset + len(block)), block.shape[1])
+        df = pd.DataFrame({"node_id": nodes, "community_id": block.ravel()})
+        df = df.drop_duplicates()
+        df = df[df.groupby("node_id").cumcount() < per_node]
+        node_id.append(df["node_id"].values)
+        com_id.append(df["community_id"].values)
+    node_id = np.concatenate(node_id)
+    return pd.DataFrame({
+        "node_id": node_id,
+        "community_id": np.concatenate(com_id),
+        "member_prob": rs.uniform(0.05, 1.0, len(node_id))
+    }, columns=membership.columns)
+
+def estimate(name, com_data, id_to_index):
+    if name == "simple":
+        return communityprior.estimate_simple(com_data, id_to_index)
+    if name == "pertopic":
+        return communityprior_pertopic.estimate_simple(com_data, id_to_index)
+    if name == "mle":
+        return communityprior.estimate_mle(com_data, id_to_index)
+    raise ValueError("Unknown estimator %s" % name)
+
+def write_cover(cover_file, num_nodes, num_coms, per_node, seed):
+    '''Write a synthetic cover as a binary cover, return its number of rows.'''
+    com_data = synthetic_cover(num_nodes, num_coms, per_node, seed)
+    writer = membership.MembershipWriter(cover_file, {"source": "synthetic", "seed": seed})
+    writer.append(com_data["node_id"].values, com_data["community_id"].values, com_data["member_prob"].values)
+    writer.close()
+    return writer.num_rows
+
+def run_case(case):
+    name, cover_file, num_nodes, num_coms, per_node = case
+    com_data = membership.read_memberships(cover_file)
+    id_to_index = nodedict.NodeDict(np.arange(num_nodes))
+    rss_before = communityprior.peak_rss()
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, "w")
+    try:
+        start = time.time()
+        estimate(name, com_data, id_to_index)
+        elapsed = time.time() - start
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+    return {
+        "estimator": name,
+        "nodes": num_nodes,
+        "communities": num_coms,
+        "per_node": per_node,
+        "rows": len(com_data),
+        "seconds": elapsed,
+        "peak_rss_mb": communityprior.peak_rss(),
+        "peak_rss_before_mb": rss_before,
+    }
+
+def in_process(func, args):
+    '''Call func in a fresh worker process, so its peak RSS is its own.'''
+    pool = multiprocessing.Pool(1)
+    try:
+        return pool.apply(func, args)
+    finally:
+        pool.close()
+        pool.join()
+
+def read_column(filename):
+    return pd.read_csv(filename, float_precision="round_trip").iloc[:,0].values
+
+def check_reference():
+    '''Compare the estimators with the reference output on examples/example.csv.'''
+    com_data = membership.read_memberships(os.path.join(example_dir, "example.csv"))
+    id_to_index = nodedict.load(os.path.join(example_dir, "example-dict.csv"))
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, "w")
+    try:
+        alpha, beta = communityprior.estimate_simple(com_data, id_to_index)
+        alpha_pt, beta_pt = communityprior_pertopic.estimate_simple(com_data, id_to_index)
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+    checks = {
+        "simple_alpha": np.array_equal(alpha, read_column(os.path.join(example_dir, "example-alpha.csv"))),
+        "simple_beta": np.array_equal(beta, read_column(os.path.join(example_dir, "example-beta.csv"))),
+        "pertopic_alpha": np.array_equal(
+            alpha_pt, read_column(os.path.join(example_dir, "example-alpha-pertopic.csv"))),
+        "pertopic_beta": bool(np.allclose(
+            beta_pt.toarray(), np.loadtxt(os.path.join(example_dir, "example-beta-pertopic.csv")),
+            rtol=1e-12, atol=0)),
+    }
+    return dict([(k, bool(v)) for k, v in checks.items()])
+
+def parse_ints(s):
+    return [int(x) for x in s.split(",")]
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark prior estimation at increasing scale")
+    parser.add_argument("--nodes", type=parse_ints, default=[1000, 10000, 100000], help="comma separated node counts")
+    parser.add_argument("--communities", type=parse_ints, default=[100], help="comma separated community counts")
+    parser.add_argument("--per-node", type=int, default=3, help="memberships per node")
+    parser.add_argument("--estimators", default="simple,pertopic,mle")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write the json report here instead of stdout")
+    args = parser.parse_args()
+
+    report = {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "reference": check_reference(),
+        "runs": [],
+    }
+    out_dir = tempfile.mkdtemp()
+    try:
+        for num_coms in args.communities:
+            for num_nodes in args.nodes:
+                cover_file = os.path.join(out_dir, "cover-%d-%d.npy" % (num_nodes, num_coms))
+                in_process(write_cover, (cover_file, num_nodes, num_coms, args.per_node, args.seed))
+                for name in args.estimators.split(","):
+                    result = in_process(run_case, ((name, cover_file, num_nodes, num_coms, args.per_node),))
+                    print >> sys.stderr, "%(estimator)s: %(nodes)d nodes, %(communities)d communities, " \
+                        "%(rows)d rows in %(seconds).3f seconds, peak RSS %(peak_rss_mb).1f MB" % result
+                    report["runs"].append(result)
+                os.remove(cover_file)
+                os.remove(membership.header_file(cover_file))
+    finally:
+        shutil.rmtree(out_dir)
+
+    if args.out:
+        with open(args.out, "wb") as f:
+            json.dump(report, f, indent=1, sort_keys=True)
+    else:
+        print json.dumps(report, indent=1, sort_keys=True)
+    if not all(report["reference"].values()):
+        print >> sys.stderr, "Reference check failed: %s" % report["reference"]
+        sys.exit(1)
@@ -1,94 +1,101 @@
-import sys
+import argparse
+import resource
 
-#import dirichlet
 import numpy as np
 import pandas as pd
+import scipy.sparse as spsparse
+import dirichletmle
+import membership
+import nodedict
 
-def data_to_matrix(com_data):
+def data_to_matrix(com_data, dense=False, shape=None):
     # Count number of nodes and communities
     # Assume the first of each is "0"
-    num_nodes = com_data['node_id'].max() + 1
-    num_coms = com_data['community_id'].max() + 1
+    if shape is None:
+        shape = (com_data['node_id'].max() + 1, com_data['community_id'].max() + 1)
+    num_nodes, num_coms = shape
     
-    # Convert to matrix
-    node_com = np.zeros((num_nodes,num_coms))
-    for i, row in com_data.iterrows():
-        node_com[int(row["node_id"]),int(row["community_id"])] = row["member_prob"]
+    # A later row for the same node and community replaces an earlier one
+    com_data = com_data.drop_duplicates(['node_id', 'community_id'], keep='last')
+    node_index = com_data['node_id'].values.astype(np.int64)
+    com_index = com_data['community_id'].values.astype(np.int64)
+    mem_p = com_data['member_prob'].values.astype(np.float64)
     
-    return node_com
+    # Convert to matrix
+    if dense:
+        node_com = np.zeros((num_nodes,num_coms))
+        node_com[node_index,com_index] = mem_p
+        return node_com
+    return spsparse.csr_matrix((mem_p, (node_index, com_index)), shape=(num_nodes,num_coms))
 
 def normalize_rows(m):
-    return m / m.sum(axis=1)[:,np.newaxis]
+    if not spsparse.issparse(m):
+        return m / m.sum(axis=1)[:,np.newaxis]
+    # Scale the stored entries only, empty rows stay empty
+    row_sums = np.asarray(m.sum(axis=1)).ravel()
+    with np.errstate(divide='ignore'):
+        scale = 1.0 / row_sums
+    return spsparse.diags(scale).dot(m).tocsr()
 
-def load_as_matrix(filename):
+def load_as_matrix(filename, dense=False):
     # node_id, community_id, member_prob
-    com_data = pd.DataFrame.from_csv(filename, index_col=None)
-    return data_to_matrix(com_data)
+    com_data = membership.read_memberships(filename)
+    return data_to_matrix(com_data, dense)
 
-def estimate_mle(com_data):
-    # Convert data into matrix
-    node_com = data_to_matrix(com_data)
+def estimate_mle(com_data, id_to_index=None, floor=1e-10):
+    # Convert data into sparse matrix
+    # With a dictionary, rows are node indexes and columns are communities in
+    # sorted id order, as in estimate_simple
+    if id_to_index is None:
+        node_com = data_to_matrix(com_data)
+    else:
+        node_index, com_index, com_ids = get_indexes(com_data, id_to_index)
+        missing = node_index < 0
+        if missing.any():
+            raise KeyError(com_data['node_id'].values[missing][0])
+        index_data = pd.DataFrame({
+            'node_id': node_index,
+            'community_id': com_index,
+            'member_prob': com_data['member_prob'].values})
+        node_com = data_to_matrix(index_data, shape=(len(id_to_index), len(com_ids)))
+    print "Estimating %d nodes and %d communities (mle)" % node_com.shape
     
     # Convert rows/cols into probability distributions
     p_com = normalize_rows(node_com)
     p_node = normalize_rows(node_com.transpose())
     
     # Estimate dirichlet parameter for distribution over communities (topics)
-    alpha = dirichlet.mle(p_com)
+    print "Estimating alpha"
+    alpha = dirichletmle.mle(p_com, floor)
     
     # Estimate dirichlet parameter for distribution over nodes (terms)
-    beta = dirichlet.mle(p_node)
+    print "Estimating beta"
+    beta = dirichletmle.mle(p_node, floor)
     
     return (alpha, beta)
 
 def get_id_to_index(dict_file):
-    id_to_index = {}
-    with open(dict_file, "rb") as f_dict:
-        f_dict.next()
-        for row in f_dict:
-            node_index, node_id = row.rstrip().split(",")
-            id_to_index[int(node_id)] = int(node_index)
-    return id_to_index
+    return nodedict.load(dict_file)
 
-def estimate_simple(com_data, id_to_index):
-    
-    # Count number of nodes and communities
-    nodes = set(id_to_index.keys())
-    coms = set(com_data["community_id"])
-    num_nodes = len(nodes)
-    num_coms = len(coms)
-    com_id_to_index = {}
-    for i, com_id in enumerate(sorted(list(coms))):
-        com_id_to_index[com_id] = i
-    
-    print "Estimating %d nodes and %d communities (simple)" % (num_nodes, num_coms)
-    
-    # Count size of each community, node
-    print "Summing weights over all communities, nodes"
-    com_nodecount = [0.0] * num_coms
-    node_comcount = [0.0] * num_nodes
-    for i, row in com_data.iterrows():
-        node_id = int(row['node_id'])
-        node_index = id_to_index[node_id]
-        com_index = com_id_to_index[int(row['community_id'])]
-        node_comcount[node_index] += row['member_prob']
-        com_nodecount[com_index] += row['member_prob']
-    
-    # Estimate by simple averaging
-    # The above totals are used to normalize samples as we add them,
-    # e.g. if there are three nodes in a community, each will contribute 1/3 when added.
-    print "Averaging distributions"
-    alpha = np.zeros((num_coms,))
-    beta = np.zeros((num_nodes,))
-    for i, row in com_data.iterrows():
-        if i % 10000 == 0:
-            print "  %d/%d" % (i, len(com_data))
-        node_index = id_to_index[int(row['node_id'])]
-        com_index = com_id_to_index[int(row['community_id'])]
-        mem_p = row['member_prob']
-        alpha[com_index] += float(mem_p) / float(node_comcount[node_index])
-        beta[node_index] += float(mem_p) / float(com_nodecount[com_index])
-    
+def as_node_dict(id_to_index):
+    '''Return id_to_index as a NodeDict, converting a plain dict.'''
+    if isinstance(id_to_index, nodedict.NodeDict):
+        return id_to_index
+    return nodedict.from_mapping(id_to_index)
+
+def lookup_indexes(id_to_index, ids):
+    '''Map an array of node ids to node indexes, or -1 for unknown ids.'''
+    return as_node_dict(id_to_index).index(ids)
+
+def get_indexes(com_data, id_to_index):
+    '''Return node indexes, community indexes and sorted community ids for
+    each membership row.
+    '''
+    node_index = lookup_indexes(id_to_index, com_data['node_id'].values)
+    com_ids, com_index = np.unique(com_data['community_id'].values, return_inverse=True)
+    return (node_index, com_index, com_ids)
+
+def smooth_simple(alpha, beta, num_nodes, num_coms):
     # Normalize alpha and beta, interpolate with uniform
     alpha = alpha / alpha.sum()
     alpha_u = np.ones(alpha.shape)
@@ -109,20 +116,159 @@ def estimate_simple(com_data, id_to_index):
      
     return (alpha, beta)
 
-if __name__ == '__main__':
-    # Load data
-    com_data = pd.DataFrame.from_csv(sys.argv[1], index_col=None)
-    id_to_index = get_id_to_index(sys.argv[2])
+def estimate_simple(com_data, id_to_index):
     
-    # Estimate
-    alpha, beta = estimate_simple(com_data, id_to_index)
+    # Map node and community ids to indexes once
+    node_index, com_index, com_ids = get_indexes(com_data, id_to_index)
+    missing = node_index < 0
+    if missing.any():
+        raise KeyError(com_data['node_id'].values[missing][0])
+    mem_p = com_data['member_prob'].values.astype(np.float64)
+    num_nodes = len(id_to_index)
+    num_coms = len(com_ids)
     
-    # Write output
-    with open(sys.argv[3], "wb") as f:
+    print "Estimating %d nodes and %d communities (simple)" % (num_nodes, num_coms)
+    
+    # Count size of each community, node
+    print "Summing weights over all communities, nodes"
+    com_nodecount = np.bincount(com_index, weights=mem_p, minlength=num_coms)
+    node_comcount = np.bincount(node_index, weights=mem_p, minlength=num_nodes)
+    
+    # Estimate by simple averaging
+    # The above totals are used to normalize samples as we add them,
+    # e.g. if there are three nodes in a community, each will contribute 1/3 when added.
+    print "Averaging distributions"
+    alpha = np.bincount(com_index, weights=mem_p / node_comcount[node_index], minlength=num_coms)
+    beta = np.bincount(node_index, weights=mem_p / com_nodecount[com_index], minlength=num_nodes)
+    
+    return smooth_simple(alpha, beta, num_nodes, num_coms)
+
+def merge_totals(ids, totals, new_ids, new_totals):
+    '''Add totals for sorted unique new_ids into totals for sorted unique ids.'''
+    pos = np.searchsorted(ids, new_ids)
+    pos[pos == len(ids)] = 0
+    if len(ids) > 0 and (ids[pos] == new_ids).all():
+        totals[pos] += new_totals
+        return (ids, totals)
+    all_ids, inverse = np.unique(np.concatenate((ids, new_ids)), return_inverse=True)
+    all_totals = np.bincount(inverse, weights=np.concatenate((totals, new_totals)), minlength=len(all_ids))
+    return (all_ids, all_totals)
+
+def index_chunk(chunk, lookup, skip_missing_zero=False):
+    '''Return node indexes, community ids and float64 weights for a chunk.
+    Unknown node ids raise KeyError, except node 0 with skip_missing_zero.
+    '''
+    node_index = lookup_indexes(lookup, chunk['node_id'].values)
+    com_id = chunk['community_id'].values.astype(np.int64)
+    mem_p = chunk['member_prob'].values.astype(np.float64)
+    missing = node_index < 0
+    if missing.any():
+        missing_ids = chunk['node_id'].values[missing]
+        if skip_missing_zero:
+            missing_ids = missing_ids[missing_ids != 0]
+        if len(missing_ids) > 0:
+            raise KeyError(missing_ids[0])
+        node_index = node_index[~missing]
+        com_id = com_id[~missing]
+        mem_p = mem_p[~missing]
+    return (node_index, com_id, mem_p)
+
+def stream_totals(com_file, lookup, chunk_rows, skip_missing_zero=False):
+    '''First pass over a membership csv in chunks.
+    Returns node totals indexed by node index, and sorted community ids with
+    their totals.
+    '''
+    node_comcount = np.zeros(len(lookup))
+    com_ids = np.zeros(0, dtype=np.int64)
+    com_nodecount = np.zeros(0)
+    num_rows = 0
+    for chunk in membership.read_memberships(com_file, chunk_rows):
+        node_index, com_id, mem_p = index_chunk(chunk, lookup, skip_missing_zero)
+        # Communities only of skipped node 0 rows are kept, as in estimate_simple
+        chunk_ids = np.unique(chunk['community_id'].values.astype(np.int64))
+        chunk_totals = np.bincount(np.searchsorted(chunk_ids, com_id), weights=mem_p, minlength=len(chunk_ids))
+        com_ids, com_nodecount = merge_totals(com_ids, com_nodecount, chunk_ids, chunk_totals)
+        node_comcount += np.bincount(node_index, weights=mem_p, minlength=len(node_comcount))
+        num_rows += len(chunk)
+        print "  %d rows" % num_rows
+    return (node_comcount, com_ids, com_nodecount)
+
+def estimate_simple_stream(com_file, id_to_index, chunk_rows):
+    '''Same estimate as estimate_simple, reading com_file in chunks of
+    chunk_rows so peak memory is bounded by the number of nodes and
+    communities rather than the size of the cover.
+    '''
+    lookup = as_node_dict(id_to_index)
+    num_nodes = len(lookup)
+    
+    # Count size of each community, node
+    print "Summing weights over all communities, nodes"
+    node_comcount, com_ids, com_nodecount = stream_totals(com_file, lookup, chunk_rows)
+    num_coms = len(com_ids)
+    print "Estimating %d nodes and %d communities (simple, streaming)" % (num_nodes, num_coms)
+    
+    # Estimate by simple averaging, see estimate_simple
+    print "Averaging distributions"
+    alpha = np.zeros(num_coms)
+    beta = np.zeros(num_nodes)
+    for chunk in membership.read_memberships(com_file, chunk_rows):
+        node_index, com_id, mem_p = index_chunk(chunk, lookup)
+        com_index = np.searchsorted(com_ids, com_id)
+        alpha += np.bincount(com_index, weights=mem_p / node_comcount[node_index], minlength=num_coms)
+        beta += np.bincount(node_index, weights=mem_p / com_nodecount[com_index], minlength=num_nodes)
+    
+    return smooth_simple(alpha, beta, num_nodes, num_coms)
+
+def write_alpha(filename, alpha):
+    with open(filename, "wb") as f:
         f.write("alpha_k\n")
         for alpha_k in alpha:
             f.write(repr(alpha_k) + "\n")
-    with open(sys.argv[4], "wb") as f:
+
+def write_beta(filename, beta):
+    with open(filename, "wb") as f:
         f.write("beta_v\n")
         for beta_v in beta:
-            f.write(repr(beta_v) + "\n")
\ No newline at end of file
+            f.write(repr(beta_v) + "\n")
+
+def peak_rss():
+    '''Peak resident set size of this process in MB.'''
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Estimate SSN-LDA priors from node communities")
+    parser.add_argument("com_file", help="csv of node_id,community_id,member_prob")
+    parser.add_argument("dict_file", help="csv of node_index,node_id")
+    parser.add_argument("alpha_file")
+    parser.add_argument("beta_file")
+    parser.add_argument("--mle", action="store_true", help="use the Dirichlet MLE instead of simple averaging")
+    parser.add_argument("--chunk-rows", type=int, help="stream the cover in chunks of this many rows")
+    parser.add_argument("--save-stats", metavar="DIR", help="save sufficient statistics for update_prior.py")
+    args = parser.parse_args()
+    if args.save_stats and (args.mle or args.chunk_rows):
+        parser.error("--save-stats needs the in-memory simple estimate")
+    if args.mle and args.chunk_rows:
+        parser.error("--chunk-rows streams the simple estimate only, not --mle")
+
+    # Load data
+    id_to_index = get_id_to_index(args.dict_file)
+    
+    # Estimate
+    if args.chunk_rows:
+        alpha, beta = estimate_simple_stream(args.com_file, id_to_index, args.chunk_rows)
+    else:
+        com_data = membership.read_memberships(args.com_file)
+        if args.mle:
+            alpha, beta = estimate_mle(com_data, id_to_index)
+        else:
+            alpha, beta = estimate_simple(com_data, id_to_index)
+        if args.save_stats:
+            # priorstats builds on this module, so import it here
+            import priorstats
+            print "Saving statistics"
+            priorstats.save_cover(args.save_stats, com_data, id_to_index)
+    
+    # Write output
+    write_alpha(args.alpha_file, alpha)
+    write_beta(args.beta_file, beta)
+    print "Peak RSS: %.1f MB" % peak_rss()
@@ -1,106 +1,76 @@
-import sys
+import argparse
+import json
+import os
 
-#import dirichlet
 import numpy as np
-import pandas as pd
+import scipy.sparse as spsparse
+import membership
+from communityprior import get_indexes, get_id_to_index, as_node_dict, index_chunk, stream_totals, peak_rss
 
-def data_to_matrix(com_data):
-    # Count number of nodes and communities
-    # Assume the first of each is "0"
-    num_nodes = com_data['node_id'].max() + 1
-    num_coms = com_data['community_id'].max() + 1
-    
-    # Convert to matrix
-    node_com = np.zeros((num_nodes,num_coms))
-    for i, row in com_data.iterrows():
-        node_com[int(row["node_id"]),int(row["community_id"])] = row["member_prob"]
-    
-    return node_com
+class SmoothedBeta(object):
+    '''Per-topic beta kept as a sparse matrix plus per-row scale and floor.
 
-def normalize_rows(m):
-    return m / m.sum(axis=1)[:,np.newaxis]
+    Row k of the dense K x V prior is
+        total * (weight * counts[k] / row_sum[k] + floor[k])
+    where counts holds the summed membership weights. Dense rows are only
+    built on request, one block at a time.
+    '''
+    def __init__(self, counts, row_sum, weight, floor, total):
+        self.counts = counts.tocsr()
+        self.row_sum = row_sum
+        self.weight = weight
+        self.floor = floor
+        self.total = total
+        self.shape = self.counts.shape
 
-def load_as_matrix(filename):
-    # node_id, community_id, member_prob
-    com_data = pd.DataFrame.from_csv(filename, index_col=None)
-    return data_to_matrix(com_data)
+    def rows(self, start, stop):
+        '''Materialize rows start to stop as a dense array.'''
+        block = self.counts[start:stop].toarray()
+        block = self.weight * block / self.row_sum[start:stop,np.newaxis]
+        block += self.floor[start:stop,np.newaxis]
+        block *= self.total
+        return block
 
-def estimate_mle(com_data):
-    # Convert data into matrix
-    node_com = data_to_matrix(com_data)
-    
-    # Convert rows/cols into probability distributions
-    p_com = normalize_rows(node_com)
-    p_node = normalize_rows(node_com.transpose())
-    
-    # Estimate dirichlet parameter for distribution over communities (topics)
-    alpha = dirichlet.mle(p_com)
-    
-    # Estimate dirichlet parameter for distribution over nodes (terms)
-    beta = dirichlet.mle(p_node)
-    
-    return (alpha, beta)
+    def iter_blocks(self, max_entries=2**23):
+        '''Yield (start, block) for consecutive dense row blocks.'''
+        num_rows, num_cols = self.shape
+        block_rows = max(1, max_entries // max(1, num_cols))
+        for start in range(0, num_rows, block_rows):
+            yield (start, self.rows(start, min(start + block_rows, num_rows)))
 
-def get_id_to_index(dict_file):
-    id_to_index = {}
-    with open(dict_file, "rb") as f_dict:
-        f_dict.next()
-        for row in f_dict:
-            node_index, node_id = row.rstrip().split(",")
-            id_to_index[int(node_id)] = int(node_index)
-    return id_to_index
+    def toarray(self):
+        return self.rows(0, self.shape[0])
 
 def estimate_simple(com_data, id_to_index):
     
-    # Count number of nodes and communities
-    nodes = set(id_to_index.keys())
-    coms = set(com_data["community_id"])
-    num_nodes = len(nodes)
-    num_coms = len(coms)
-    com_id_to_index = {}
-    for i, com_id in enumerate(sorted(list(coms))):
-        com_id = int(com_id)
-        com_id_to_index[com_id] = i
+    # Map node and community ids to indexes once
+    node_index, com_index, com_ids = get_indexes(com_data, id_to_index)
+    mem_p = com_data['member_prob'].values.astype(np.float64)
+    missing = node_index < 0
+    if missing.any():
+        # Node 0 may be absent from the dictionary, skip its rows
+        missing_ids = com_data['node_id'].values[missing]
+        if (missing_ids != 0).any():
+            raise KeyError(missing_ids[missing_ids != 0][0])
+        node_index = node_index[~missing]
+        com_index = com_index[~missing]
+        mem_p = mem_p[~missing]
+    num_nodes = len(id_to_index)
+    num_coms = len(com_ids)
     
     print "Estimating %d nodes and %d communities (simple)" % (num_nodes, num_coms)
     
     # Count size of each community, node
     print "Summing weights over all communities, nodes"
-    com_nodecount = [0.0] * num_coms
-    node_comcount = [0.0] * num_nodes
-    for i, row in com_data.iterrows():
-        node_id = int(row['node_id'])
-        try:
-            node_index = id_to_index[node_id]
-        except KeyError:
-            if node_id == 0:
-                continue
-            raise
-        com_id = int(row['community_id'])
-        com_index = com_id_to_index[com_id]
-        node_comcount[node_index] += row['member_prob']
-        com_nodecount[com_index] += row['member_prob']
+    node_comcount = np.bincount(node_index, weights=mem_p, minlength=num_nodes)
     
     # Estimate by simple averaging
     # The above totals are used to normalize samples as we add them,
     # e.g. if there are three nodes in a community, each will contribute 1/3 when added.
     print "Averaging distributions"
-    alpha = np.zeros((num_coms,))
-    beta = np.zeros((num_coms,num_nodes))
-    for i, row in com_data.iterrows():
-        if i % 10000 == 0:
-            print "  %d/%d" % (i, len(com_data))
-        try:
-            node_index = id_to_index[int(row['node_id'])]
-        except KeyError:
-            if int(row['node_id']) == 0:
-                continue
-            raise
-        com_index = com_id_to_index[int(row['community_id'])]
-        mem_p = row['member_prob']
-        # Normalize per-node weight distributions before adding to alpha
-        alpha[com_index] += float(mem_p) / float(node_comcount[node_index])
-        beta[com_index, node_index] += mem_p
+    # Normalize per-node weight distributions before adding to alpha
+    alpha = np.bincount(com_index, weights=mem_p / node_comcount[node_index], minlength=num_coms)
+    beta = spsparse.csr_matrix((mem_p, (com_index, node_index)), shape=(num_coms,num_nodes))
 
     # Normalize alpha and interpolate with univorm
     print "Normalizing alpha"
@@ -109,38 +79,137 @@ def estimate_simple(com_data, id_to_index):
     alpha_u = alpha_u / alpha_u.sum()
     alpha = 0.9*alpha + 0.1*alpha_u
         
-    # Normalize beta and interpolate with uniform
+    # Normalize beta and interpolate with uniform, without densifying
     print "Normalizing beta"
-    beta_sum = beta.sum(axis=1)
+    beta_sum = np.bincount(com_index, weights=mem_p, minlength=num_coms)
     beta_u = 1.0 / num_coms
-    for com in range(num_coms):
-        for node in range(num_nodes):
-            b = beta[com, node]
-            b = 0.9 * b / beta_sum[com]
-            b += 0.1 * beta_u
-            beta[com, node] = b
     
     # Scale using gensim defaults
     alpha_total = 1.0
     beta_total = float(num_nodes) / float(num_coms)
     if alpha_total != 1.0:
         alpha = alpha * alpha_total
-    if beta_total != 1.0:
-        beta = beta * beta_total
+    beta = SmoothedBeta(beta, beta_sum, 0.9, np.ones(num_coms) * 0.1 * beta_u, beta_total)
+    
+    return (alpha, beta)
+
+def estimate_simple_stream(com_file, id_to_index, chunk_rows):
+    '''Same estimate as estimate_simple, reading com_file in chunks of
+    chunk_rows. Only the sparse beta grows with the size of the cover.
+    '''
+    lookup = as_node_dict(id_to_index)
+    num_nodes = len(lookup)
+    
+    # Count size of each community, node
+    print "Summing weights over all communities, nodes"
+    node_comcount, com_ids, beta_sum = stream_totals(com_file, lookup, chunk_rows, skip_missing_zero=True)
+    num_coms = len(com_ids)
+    print "Estimating %d nodes and %d communities (simple, streaming)" % (num_nodes, num_coms)
+    
+    # Estimate by simple averaging, see estimate_simple
+    print "Averaging distributions"
+    alpha = np.zeros(num_coms)
+    rows = []
+    cols = []
+    weights = []
+    for chunk in membership.read_memberships(com_file, chunk_rows):
+        node_index, com_id, mem_p = index_chunk(chunk, lookup, skip_missing_zero=True)
+        com_index = np.searchsorted(com_ids, com_id)
+        alpha += np.bincount(com_index, weights=mem_p / node_comcount[node_index], minlength=num_coms)
+        rows.append(com_index.astype(np.int32))
+        cols.append(node_index.astype(np.int32))
+        weights.append(mem_p)
+    beta = spsparse.csr_matrix(
+        (np.concatenate(weights), (np.concatenate(rows), np.concatenate(cols))),
+        shape=(num_coms,num_nodes))
+    
+    # Normalize alpha and interpolate with uniform, scale beta as in estimate_simple
+    print "Normalizing alpha"
+    alpha = alpha / alpha.sum()
+    alpha_u = np.ones(alpha.shape)
+    alpha_u = alpha_u / alpha_u.sum()
+    alpha = 0.9*alpha + 0.1*alpha_u
+    beta_u = 1.0 / num_coms
+    beta_total = float(num_nodes) / float(num_coms)
+    beta = SmoothedBeta(beta, beta_sum, 0.9, np.ones(num_coms) * 0.1 * beta_u, beta_total)
     
     return (alpha, beta)
 
+def write_beta_text(filename, beta):
+    '''Write the dense per-topic beta with np.savetxt, one block at a time.'''
+    with open(filename, "wb") as f:
+        for start, block in beta.iter_blocks():
+            np.savetxt(f, block)
+
+def header_file(beta_file):
+    return os.path.splitext(beta_file)[0] + ".json"
+
+def write_beta_binary(filename, beta, dtype=np.float32):
+    '''Write the dense per-topic beta as a .npy file that can be memory-mapped,
+    with a json header giving its shape and smoothing parameters.
+    The default dtype matches the one gensim uses for eta, so the mapped
+    file can be used without a copy.
+    '''
+    out = np.lib.format.open_memmap(filename, mode="w+", dtype=dtype, shape=beta.shape)
+    for start, block in beta.iter_blocks():
+        out[start:start + len(block)] = block
+    out.flush()
+    del out
+    header = {
+        "num_topics": beta.shape[0],
+        "num_words": beta.shape[1],
+        "dtype": np.dtype(dtype).name,
+        "weight": beta.weight,
+        "floor": float(beta.floor[0]) if len(beta.floor) > 0 else 0.0,
+        "total": beta.total,
+    }
+    with open(header_file(filename), "wb") as f:
+        json.dump(header, f, indent=1, sort_keys=True)
+
+def load_beta(filename):
+    '''Load a per-topic beta written by this script.
+    Binary priors are memory-mapped read-only, text priors are parsed.
+    '''
+    with open(filename, "rb") as f:
+        is_binary = f.read(6) == np.lib.format.MAGIC_PREFIX
+    if not is_binary:
+        return np.loadtxt(filename)
+    beta = np.load(filename, mmap_mode="r")
+    if os.path.exists(header_file(filename)):
+        with open(header_file(filename), "rb") as f:
+            header = json.load(f)
+        if beta.shape != (header["num_topics"], header["num_words"]):
+            raise ValueError("%s is %d x %d, header says %d x %d" % (
+                (filename,) + beta.shape + (header["num_topics"], header["num_words"])))
+    return beta
+
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Estimate per-topic SSN-LDA priors from node communities")
+    parser.add_argument("com_file", help="csv of node_id,community_id,member_prob")
+    parser.add_argument("dict_file", help="csv of node_index,node_id")
+    parser.add_argument("alpha_file")
+    parser.add_argument("beta_file", help="binary .npy prior, or text with --text")
+    parser.add_argument("--text", action="store_true", help="write beta with np.savetxt instead of .npy")
+    parser.add_argument("--chunk-rows", type=int, help="stream the cover in chunks of this many rows")
+    args = parser.parse_args()
+
     # Load data
-    com_data = pd.DataFrame.from_csv(sys.argv[1], header=0, index_col=None)
-    id_to_index = get_id_to_index(sys.argv[2])
+    id_to_index = get_id_to_index(args.dict_file)
     
     # Estimate
-    alpha, beta = estimate_simple(com_data, id_to_index)
+    if args.chunk_rows:
+        alpha, beta = estimate_simple_stream(args.com_file, id_to_index, args.chunk_rows)
+    else:
+        com_data = membership.read_memberships(args.com_file)
+        alpha, beta = estimate_simple(com_data, id_to_index)
     
     # Write output
-    with open(sys.argv[3], "wb") as f:
+    with open(args.alpha_file, "wb") as f:
         f.write("alpha_k\n")
         for alpha_k in alpha:
             f.write(repr(alpha_k) + "\n")
-    np.savetxt(sys.argv[4], beta)
+    if args.text:
+        write_beta_text(args.beta_file, beta)
+    else:
+        write_beta_binary(args.beta_file, beta)
+    print "Peak RSS: %.1f MB" % peak_rss()
@@ -0,0 +1,171 @@
+import hashlib
+import json
+import os
+import shutil
+import numpy as np
+
+# Binary corpus stored as compressed sparse rows next to the text corpus:
+#   <prefix>-indptr.npy    int64, document i is entries indptr[i]:indptr[i+1]
+#   <prefix>-indices.npy   int32 term indexes, sorted within each document
+#   <prefix>-counts.npy    int32 term counts, or float32 summed edge weights
+#   <prefix>-meta.json     num_docs, num_terms, nnz, weighted,
+#                          degree_histogram, sha1
+# where prefix is the corpus file name without its extension. The arrays are
+# memory-mapped, so processes reading the same corpus share the page cache.
+
+arrays = ["indptr", "indices", "counts"]
+
+def prefix(corpus_file):
+    return os.path.splitext(corpus_file)[0]
+
+def array_file(corpus_file, name):
+    return "%s-%s.npy" % (prefix(corpus_file), name)
+
+def meta_file(corpus_file):
+    return prefix(corpus_file) + "-meta.json"
+
+def exists(corpus_file):
+    '''True if a complete binary corpus exists, the metadata is written last.'''
+    return os.path.exists(meta_file(corpus_file))
+
+def dtypes(weighted):
+    return {
+        "indptr": np.int64,
+        "indices": np.int32,
+        "counts": np.float32 if weighted else np.int32,
+    }
+
+def degree_histogram(indptr):
+    '''Count of documents by number of entries, where bin k > 0 holds
+    documents with 2**(k-1) to 2**k - 1 entries and bin 0 empty documents.
+    '''
+    lengths = np.diff(indptr)
+    bins = np.zeros(len(lengths), dtype=np.int64)
+    bins[lengths > 0] = np.floor(np.log2(lengths[lengths > 0])).astype(np.int64) + 1
+    return np.bincount(bins).tolist()
+
+def content_hash(corpus_file, block_bytes=2**22):
+    '''sha1 of the array files.'''
+    h = hashlib.sha1()
+    for name in arrays:
+        with open(array_file(corpus_file, name), "rb") as f:
+            for block in iter(lambda: f.read(block_bytes), ""):
+                h.update(block)
+    return h.hexdigest()
+
+def write_meta(corpus_file, indptr, num_terms, weighted, self_token=None):
+    '''Write the metadata for the array files, which are already written.
+    self_token, when known, records whether documents hold their own node.
+    '''
+    meta = {
+        "num_docs": len(indptr) - 1,
+        "num_terms": int(num_terms),
+        "nnz": int(indptr[-1]),
+        "weighted": bool(weighted),
+        "degree_histogram": degree_histogram(indptr),
+        "sha1": content_hash(corpus_file),
+    }
+    if self_token is not None:
+        meta["self_token"] = bool(self_token)
+    path = meta_file(corpus_file)
+    with open(path + ".tmp", "wb") as f:
+        json.dump(meta, f, indent=1, sort_keys=True)
+    os.rename(path + ".tmp", path)
+
+def remove(corpus_file):
+    '''Delete a binary corpus, metadata first.'''
+    for path in [meta_file(corpus_file)] + [array_file(corpus_file, name) for name in arrays]:
+        if os.path.exists(path):
+            os.remove(path)
+
+def load_meta(corpus_file):
+    with open(meta_file(corpus_file), "rb") as f:
+        return json.load(f)
+
+def write(corpus_file, indptr, indices, counts, num_terms, self_token=None):
+    '''Write a binary corpus, each file is replaced atomically.'''
+    weighted = np.asarray(counts).dtype.kind == "f"
+    values = {"indptr": indptr, "indices": indices, "counts": counts}
+    for name in arrays:
+        path = array_file(corpus_file, name)
+        with open(path + ".tmp", "wb") as f:
+            np.save(f, np.asarray(values[name], dtype=dtypes(weighted)[name]))
+        os.rename(path + ".tmp", path)
+    write_meta(corpus_file, np.asarray(indptr), num_terms, weighted, self_token)
+
+class CSRWriter(object):
+    '''Write a binary corpus a block of documents at a time. Entries are
+    appended to raw files, which become .npy files on close.
+    '''
+    def __init__(self, corpus_file, num_terms, weighted=False, self_token=None):
+        self.corpus_file = corpus_file
+        self.num_terms = num_terms
+        self.weighted = weighted
+        self.self_token = self_token
+        self.dtypes = dtypes(weighted)
+        self.files = dict([(name, open(array_file(corpus_file, name) + ".raw", "wb")) for name in ["indices", "counts"]])
+        self.lengths = []
+        self.nnz = 0
+
+    def append(self, indptr, indices, counts):
+        '''Append documents given as a local indptr with their entries.'''
+        self.lengths.append(np.diff(indptr))
+        self.files["indices"].write(np.asarray(indices, dtype=self.dtypes["indices"]).tobytes())
+        self.files["counts"].write(np.asarray(counts, dtype=self.dtypes["counts"]).tobytes())
+        self.nnz += len(indices)
+
+    def close(self):
+        lengths = np.concatenate(self.lengths) if self.lengths else np.zeros(0, dtype=np.int64)
+        indptr = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=indptr[1:])
+        path = array_file(self.corpus_file, "indptr")
+        with open(path + ".tmp", "wb") as f:
+            np.save(f, indptr)
+        os.rename(path + ".tmp", path)
+        for name in ["indices", "counts"]:
+            self.files[name].close()
+            path = array_file(self.corpus_file, name)
+            with open(path + ".tmp", "wb") as f:
+                np.lib.format.write_array_header_1_0(f, {
+                    "descr": np.lib.format.dtype_to_descr(np.dtype(self.dtypes[name])),
+                    "fortran_order": False,
+                    "shape": (self.nnz,),
+                })
+                with open(path + ".raw", "rb") as f_raw:
+                    shutil.copyfileobj(f_raw, f)
+            os.rename(path + ".tmp", path)
+            os.remove(path + ".raw")
+        write_meta(self.corpus_file, indptr, self.num_terms, self.weighted, self.self_token)
+
+class CSRCorpus(object):
+    '''Memory-mapped binary corpus yielding [(term, count), ...] documents.'''
+    def __init__(self, corpus_file, block_entries=2**18):
+        self.meta = load_meta(corpus_file)
+        self.indptr = np.load(array_file(corpus_file, "indptr"), mmap_mode="r")
+        self.indices = np.load(array_file(corpus_file, "indices"), mmap_mode="r")
+        self.counts = np.load(array_file(corpus_file, "counts"), mmap_mode="r")
+        self.num_terms = self.meta["num_terms"]
+        self.block_entries = block_entries
+
+    def __len__(self):
+        return len(self.indptr) - 1
+
+    def __getitem__(self, doc):
+        start, stop = self.indptr[doc], self.indptr[doc + 1]
+        return zip(self.indices[start:stop].tolist(), self.counts[start:stop].tolist())
+
+    def __iter__(self):
+        num_docs = len(self)
+        start = 0
+        while start < num_docs:
+            # Convert a block of documents at a time
+            stop = np.searchsorted(self.indptr, self.indptr[start] + self.block_entries, side='right') - 1
+            stop = min(max(stop, start + 1), num_docs)
+            bounds = np.asarray(self.indptr[start:stop + 1])
+            entries = zip(
+                self.indices[bounds[0]:bounds[-1]].tolist(),
+                self.counts[bounds[0]:bounds[-1]].tolist())
+            bounds = (bounds - bounds[0]).tolist()
+            for i in range(stop - start):
+                yield entries[bounds[i]:bounds[i + 1]]
+            start = stop
@@ -0,0 +1,145 @@
+import bz2
+import json
+import os
+import sys
+import zlib
+import numpy as np
+from corpus import CSRCorpus
+
+# Compressed corpus of independently compressed blocks of block_docs
+# documents, written from a binary corpus:
+#   <prefix>-blocks.bin        compressed blocks
+#   <prefix>-blocks-index.npy  int64 byte offsets, block k is offsets[k]:offsets[k+1]
+#   <prefix>-blocks.json       num_docs, num_terms, block_docs, codec, weighted
+#                              and the binary corpus metadata
+# A block holds int32 document lengths, int32 term indexes stored as
+# differences within each document, and the counts.
+
+codecs = {
+    "zlib": (zlib.compress, zlib.decompress),
+    "bz2": (bz2.compress, bz2.decompress),
+}
+
+def blocks_file(corpus_file):
+    return CSRCorpus.prefix(corpus_file) + "-blocks.bin"
+
+def index_file(corpus_file):
+    return CSRCorpus.prefix(corpus_file) + "-blocks-index.npy"
+
+def meta_file(corpus_file):
+    return CSRCorpus.prefix(corpus_file) + "-blocks.json"
+
+def exists(corpus_file):
+    return os.path.exists(meta_file(corpus_file))
+
+def encode(indptr, indices, counts):
+    '''Serialize documents given as a local indptr with their entries.'''
+    lengths = np.diff(indptr).astype(np.int32)
+    deltas = np.asarray(indices, dtype=np.int32).copy()
+    deltas[1:] -= indices[:-1]
+    # The first term of each document is stored as is
+    starts = indptr[:-1][lengths > 0]
+    deltas[starts] = indices[starts]
+    return lengths.tobytes() + deltas.tobytes() + np.asarray(counts).tobytes()
+
+def decode(data, num_docs, count_dtype):
+    '''Inverse of encode, returns (indptr, indices, counts).'''
+    lengths = np.frombuffer(data, dtype=np.int32, count=num_docs)
+    indptr = np.zeros(num_docs + 1, dtype=np.int64)
+    np.cumsum(lengths, out=indptr[1:])
+    nnz = indptr[-1]
+    offset = lengths.nbytes
+    deltas = np.frombuffer(data, dtype=np.int32, count=nnz, offset=offset)
+    counts = np.frombuffer(data, dtype=count_dtype, count=nnz, offset=offset + deltas.nbytes)
+    total = np.cumsum(deltas, dtype=np.int64)
+    starts = indptr[:-1][lengths > 0]
+    base = np.repeat(total[starts] - deltas[starts], lengths[lengths > 0])
+    return (indptr, total - base, counts)
+
+def write(corpus_file, block_docs=4096, codec="zlib"):
+    '''Write the compressed corpus for an existing binary corpus.'''
+    compress = codecs[codec][0]
+    c = CSRCorpus.CSRCorpus(corpus_file)
+    num_docs = len(c)
+    offsets = [0]
+    path = blocks_file(corpus_file)
+    with open(path + ".tmp", "wb") as f:
+        for start in range(0, num_docs, block_docs):
+            stop = min(start + block_docs, num_docs)
+            indptr = np.asarray(c.indptr[start:stop + 1])
+            data = encode(indptr - indptr[0], c.indices[indptr[0]:indptr[-1]], c.counts[indptr[0]:indptr[-1]])
+            f.write(compress(data))
+            offsets.append(f.tell())
+    os.rename(path + ".tmp", path)
+    np.save(index_file(corpus_file), np.array(offsets, dtype=np.int64))
+    meta = dict(c.meta)
+    meta.update({"block_docs": block_docs, "codec": codec})
+    path = meta_file(corpus_file)
+    with open(path + ".tmp", "wb") as f:
+        json.dump(meta, f, indent=1, sort_keys=True)
+    os.rename(path + ".tmp", path)
+    return meta
+
+def load_meta(corpus_file):
+    with open(meta_file(corpus_file), "rb") as f:
+        return json.load(f)
+
+class CompressedCorpus(object):
+    '''Compressed corpus yielding [(term, count), ...] documents, read block
+    by block in order, or one document by node index.
+    '''
+    def __init__(self, corpus_file):
+        self.corpus_file = corpus_file
+        self.meta = load_meta(corpus_file)
+        self.offsets = np.load(index_file(corpus_file))
+        self.num_terms = self.meta["num_terms"]
+        self.block_docs = self.meta["block_docs"]
+        self.decompress = codecs[self.meta["codec"]][1]
+        self.count_dtype = CSRCorpus.dtypes(self.meta["weighted"])["counts"]
+        self.cached = (None, None)
+
+    def __len__(self):
+        return self.meta["num_docs"]
+
+    def decode_block(self, block, data):
+        num_docs = min(self.block_docs, len(self) - block * self.block_docs)
+        return decode(self.decompress(data), num_docs, self.count_dtype)
+
+    def documents(self, indptr, indices, counts):
+        entries = zip(indices.tolist(), counts.tolist())
+        bounds = indptr.tolist()
+        for i in range(len(bounds) - 1):
+            yield entries[bounds[i]:bounds[i + 1]]
+
+    def block(self, block):
+        '''Decoded (indptr, indices, counts) of one block, the last one read
+        is cached.
+        '''
+        if self.cached[0] != block:
+            with open(blocks_file(self.corpus_file), "rb") as f:
+                f.seek(self.offsets[block])
+                data = f.read(self.offsets[block + 1] - self.offsets[block])
+            self.cached = (block, self.decode_block(block, data))
+        return self.cached[1]
+
+    def __getitem__(self, doc):
+        if doc < 0 or doc >= len(self):
+            raise IndexError(doc)
+        indptr, indices, counts = self.block(doc // self.block_docs)
+        i = doc % self.block_docs
+        start, stop = indptr[i], indptr[i + 1]
+        return zip(indices[start:stop].tolist(), counts[start:stop].tolist())
+
+    def __iter__(self):
+        with open(blocks_file(self.corpus_file), "rb") as f:
+            for block in range(len(self.offsets) - 1):
+                data = f.read(self.offsets[block + 1] - self.offsets[block])
+                for document in self.documents(*self.decode_block(block, data)):
+                    yield document
+
+if __name__ == '__main__':
+    # python -m corpus.CompressedCorpus data/networks/flickr-corpus.csv [zlib|bz2]
+    corpus_file = sys.argv[1]
+    codec = sys.argv[2] if len(sys.argv) > 2 else "zlib"
+    meta = write(corpus_file, codec=codec)
+    print "Wrote %d documents in %d bytes" % (meta["num_docs"], os.path.getsize(blocks_file(corpus_file)))
@@ -0,0 +1,315 @@
+import fcntl
+import glob
+import json
+import os
+import threading
+import numpy as np
+from corpus import builder
+from corpus import CSRCorpus
+import nodedict
+
+# Incremental updates of a binary corpus. New edges are written as delta
+# segments next to the base corpus, and nodes not yet in the dictionary
+# are appended to it, so existing node indexes never change.
+# New nodes grow num_terms, so priors estimated for the old corpus fail
+# GraphCorpus.check_num_terms and have to be re-estimated.
+#   <prefix>-deltas.json            manifest: the current base corpus, the
+#                                   segments on top of it, num_docs, num_terms
+#                                   and self_token of the build
+#   <prefix>-delta<k>-*.npy, .json  segment k, a binary corpus of the added
+#                                   (term, count) entries of some documents
+#   <prefix>-delta<k>-docs.npy      node index of each segment document
+# compact() folds the segments into a new base <prefix>-gen<g>. Replacing the
+# manifest is the only step readers see, so they get the old or new state.
+# The folded segments and the previous base are listed as retired in the
+# manifest and deleted keep_generations compactions later, so readers that
+# loaded an older manifest (GraphCorpus keeps the one it was created with)
+# can finish their passes.
+# Appends and manifest updates hold <prefix>-deltas.lock, a compaction holds
+# <prefix>-compact.lock throughout so only one runs at a time.
+# A full rebuild with builder.edges_to_corpus removes all of these files
+# except the locks, which are never deleted.
+
+def manifest_file(corpus_file):
+    return CSRCorpus.prefix(corpus_file) + "-deltas.json"
+
+def lock_file(corpus_file):
+    return CSRCorpus.prefix(corpus_file) + "-deltas.lock"
+
+def compact_lock_file(corpus_file):
+    return CSRCorpus.prefix(corpus_file) + "-compact.lock"
+
+def exists(corpus_file):
+    return os.path.exists(manifest_file(corpus_file))
+
+def segment_file(corpus_file, segment):
+    return "%s-delta%d%s" % (CSRCorpus.prefix(corpus_file), segment, os.path.splitext(corpus_file)[1])
+
+def docs_file(segment_corpus):
+    return CSRCorpus.prefix(segment_corpus) + "-docs.npy"
+
+def generation_file(corpus_file, generation):
+    return "%s-gen%d%s" % (CSRCorpus.prefix(corpus_file), generation, os.path.splitext(corpus_file)[1])
+
+def path(corpus_file, name):
+    '''Manifest entries are file names in the corpus directory.'''
+    return os.path.join(os.path.dirname(corpus_file), name)
+
+def load_manifest(corpus_file):
+    if exists(corpus_file):
+        with open(manifest_file(corpus_file), "rb") as f:
+            return json.load(f)
+    meta = CSRCorpus.load_meta(corpus_file)
+    return {
+        "base": os.path.basename(corpus_file),
+        "generation": 0,
+        "segments": [],
+        "next_segment": 0,
+        "num_docs": meta["num_docs"],
+        "num_terms": meta["num_terms"],
+        "weighted": meta["weighted"],
+        "self_token": meta.get("self_token"),
+        "retired": [],
+    }
+
+def save_manifest(corpus_file, manifest):
+    target = manifest_file(corpus_file)
+    with open(target + ".tmp", "wb") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.rename(target + ".tmp", target)
+
+class Lock(object):
+    '''Exclusive lock on a corpus's delta manifest, or with
+    lock=compact_lock_file on compacting it.
+    '''
+    def __init__(self, corpus_file, lock=lock_file):
+        self.filename = lock(corpus_file)
+
+    def __enter__(self):
+        self.f = open(self.filename, "ab")
+        fcntl.flock(self.f, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *args):
+        fcntl.flock(self.f, fcntl.LOCK_UN)
+        self.f.close()
+
+def combine(docs, terms, counts, num_terms):
+    '''Aggregate (doc, term, count) entries. Returns the sorted unique docs
+    with a local indptr and their sorted unique (term, count) entries.
+    '''
+    keys, inverse = np.unique(docs * np.int64(num_terms) + terms, return_inverse=True)
+    totals = np.bincount(inverse, weights=counts, minlength=len(keys))
+    if counts.dtype.kind in "iu":
+        totals = totals.astype(counts.dtype)
+    unique_docs, lengths = np.unique(keys // num_terms, return_counts=True)
+    indptr = np.zeros(len(unique_docs) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=indptr[1:])
+    return (unique_docs, indptr, keys % num_terms, totals)
+
+def append_edges(corpus_file, dict_file, source, target, weight=None, self_token=None):
+    '''Record edges given as node id arrays as a new delta segment. Nodes not
+    in the dictionary are appended to it, with a self token if the corpus
+    was built with self_token. self_token only has to be given for corpora
+    whose build did not record it, and is then kept in the manifest.
+    Returns the node indexes of the new nodes.
+    '''
+    with Lock(corpus_file):
+        manifest = load_manifest(corpus_file)
+        if manifest["weighted"] != (weight is not None):
+            raise ValueError("Corpus %s is %s" % (corpus_file, "weighted" if manifest["weighted"] else "unweighted"))
+        if manifest.get("self_token") is None:
+            if self_token is None:
+                raise ValueError("Corpus %s does not record self_token, give it for the first append" % corpus_file)
+            manifest["self_token"] = bool(self_token)
+        elif self_token is not None and bool(self_token) != manifest["self_token"]:
+            raise ValueError("Corpus %s was built with self_token=%s" % (corpus_file, manifest["self_token"]))
+        self_token = manifest["self_token"]
+        lookup = nodedict.load(dict_file)
+        if len(lookup) != manifest["num_docs"]:
+            raise ValueError("%s has %d nodes but the corpus has %d" % (dict_file, len(lookup), manifest["num_docs"]))
+        ids = np.concatenate((source, target))
+        new_ids = np.unique(ids[lookup.index(ids) < 0])
+        num_docs = len(lookup) + len(new_ids)
+        new_nodes = np.arange(len(lookup), num_docs)
+        if len(new_ids) > 0:
+            with open(dict_file, "ab") as f_dict:
+                f_dict.write("".join(["%d,%d\n" % pair for pair in zip(new_nodes.tolist(), new_ids.tolist())]))
+        lookup = nodedict.NodeDict(np.concatenate((lookup.ids, new_ids)))
+        if len(new_ids) > 0:
+            nodedict.save_cache(dict_file, lookup.ids)
+
+        source = lookup.index(source)
+        target = lookup.index(target)
+        docs = np.concatenate((source, target))
+        terms = np.concatenate((target, source))
+        if weight is None:
+            counts = np.ones(len(docs), dtype=np.int32)
+        else:
+            counts = np.concatenate((weight, weight))
+        if self_token:
+            docs = np.concatenate((docs, new_nodes))
+            terms = np.concatenate((terms, new_nodes))
+            counts = np.concatenate((counts, np.ones(len(new_nodes), dtype=counts.dtype)))
+        seg_docs, indptr, terms, counts = combine(docs, terms, counts, num_docs)
+
+        segment = manifest["next_segment"]
+        seg_file = segment_file(corpus_file, segment)
+        np.save(docs_file(seg_file), seg_docs)
+        CSRCorpus.write(seg_file, indptr, terms, counts, num_docs)
+        manifest["segments"].append(os.path.basename(seg_file))
+        manifest["next_segment"] = segment + 1
+        manifest["num_docs"] = num_docs
+        manifest["num_terms"] = num_docs
+        save_manifest(corpus_file, manifest)
+    return new_nodes
+
+def append_edge_file(corpus_file, dict_file, edge_file, delimiter=' ', header=False, comment='#', self_token=None,
+                     weighted=False):
+    '''append_edges for an edge list file.'''
+    source, target, weight = builder.read_edges(edge_file, delimiter, header, comment, weighted)
+    return append_edges(corpus_file, dict_file, source, target, weight, self_token)
+
+def load_segments(corpus_file, segments, num_terms):
+    '''All entries of the segments aggregated as by combine.'''
+    docs, terms, counts = [], [], []
+    for name in segments:
+        seg_file = path(corpus_file, name)
+        c = CSRCorpus.CSRCorpus(seg_file)
+        seg_docs = np.load(docs_file(seg_file))
+        docs.append(np.repeat(seg_docs, np.diff(c.indptr)))
+        terms.append(np.asarray(c.indices))
+        counts.append(np.asarray(c.counts))
+    if not docs:
+        return (np.zeros(0, dtype=np.int64), np.zeros(1, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0))
+    return combine(np.concatenate(docs), np.concatenate(terms), np.concatenate(counts), num_terms)
+
+def remove_retired(corpus_file, retired):
+    '''Delete the files a compaction replaced.'''
+    if retired["base"] is not None:
+        CSRCorpus.remove(path(corpus_file, retired["base"]))
+    for name in retired["segments"]:
+        seg_file = path(corpus_file, name)
+        CSRCorpus.remove(seg_file)
+        if os.path.exists(docs_file(seg_file)):
+            os.remove(docs_file(seg_file))
+
+def compact(corpus_file, block_docs=2**16, keep_generations=1):
+    '''Fold the current segments into a new base corpus. Segments appended
+    while compacting are kept, a concurrent compaction waits for this one.
+    The replaced files are deleted once keep_generations newer compactions
+    have replaced them too.
+    '''
+    with Lock(corpus_file, compact_lock_file):
+        manifest = load_manifest(corpus_file)
+        segments = list(manifest["segments"])
+        if not segments:
+            return manifest
+        num_docs = manifest["num_docs"]
+        base_file = path(corpus_file, manifest["base"])
+        base = CSRCorpus.CSRCorpus(base_file)
+        delta_docs, delta_indptr, delta_terms, delta_counts = load_segments(corpus_file, segments, num_docs)
+        entry_docs = np.repeat(delta_docs, np.diff(delta_indptr))
+        generation = manifest["generation"] + 1
+        new_file = generation_file(corpus_file, generation)
+        writer = CSRCorpus.CSRWriter(new_file, num_docs, manifest["weighted"], manifest.get("self_token"))
+        for start in range(0, num_docs, block_docs):
+            stop = min(start + block_docs, num_docs)
+            base_stop = min(stop, len(base))
+            if start < base_stop:
+                indptr = np.asarray(base.indptr[start:base_stop + 1])
+                docs = np.repeat(np.arange(start, base_stop), np.diff(indptr))
+                terms = np.asarray(base.indices[indptr[0]:indptr[-1]])
+                counts = np.asarray(base.counts[indptr[0]:indptr[-1]])
+            else:
+                docs = np.zeros(0, dtype=np.int64)
+                terms = np.zeros(0, dtype=np.int32)
+                counts = np.zeros(0, dtype=base.counts.dtype)
+            a, b = np.searchsorted(entry_docs, [start, stop])
+            docs = np.concatenate((docs, entry_docs[a:b])) - start
+            terms = np.concatenate((terms, delta_terms[a:b]))
+            counts = np.concatenate((counts, delta_counts[a:b].astype(counts.dtype)))
+            present, indptr, terms, counts = combine(docs, terms, counts, num_docs)
+            if len(present) != stop - start:
+                raise ValueError("Documents without entries in %d - %d" % (start, stop))
+            writer.append(indptr, terms, counts)
+        writer.close()
+
+        with Lock(corpus_file):
+            manifest = load_manifest(corpus_file)
+            manifest["segments"] = [name for name in manifest["segments"] if name not in segments]
+            manifest["base"] = os.path.basename(new_file)
+            manifest["generation"] = generation
+            # The original corpus is only deleted by a rebuild
+            old_base = os.path.basename(base_file)
+            retired = manifest.get("retired", []) + [{
+                "generation": generation,
+                "base": old_base if old_base != os.path.basename(corpus_file) else None,
+                "segments": segments,
+            }]
+            expired = [r for r in retired if r["generation"] <= generation - keep_generations]
+            manifest["retired"] = [r for r in retired if r["generation"] > generation - keep_generations]
+            save_manifest(corpus_file, manifest)
+        for r in expired:
+            remove_retired(corpus_file, r)
+        return manifest
+
+def remove_updates(corpus_file):
+    '''Delete the manifest, segments and compacted generations of a corpus,
+    so a rebuilt binary corpus is read instead of the stale updates. The
+    lock files stay, a process waiting on one must lock the same file as
+    the next process to open it.
+    '''
+    if not exists(corpus_file) and not os.path.exists(lock_file(corpus_file)):
+        # Nothing was ever appended
+        return
+    with Lock(corpus_file, compact_lock_file):
+        with Lock(corpus_file):
+            if exists(corpus_file):
+                os.remove(manifest_file(corpus_file))
+            corpus_prefix = CSRCorpus.prefix(corpus_file)
+            for path in glob.glob(corpus_prefix + "-delta[0-9]*") + glob.glob(corpus_prefix + "-gen[0-9]*"):
+                os.remove(path)
+
+def compact_in_background(corpus_file):
+    '''Run compact on a daemon thread, returns the started thread.'''
+    thread = threading.Thread(target=compact, args=(corpus_file,))
+    thread.daemon = True
+    thread.start()
+    return thread
+
+class DeltaCorpus(object):
+    '''Base corpus with its delta segments merged on the fly, yielding sorted
+    unique (term, count) documents for every node including appended ones.
+    Every pass reads the state of the manifest given or loaded on creation.
+    '''
+    def __init__(self, corpus_file, manifest=None):
+        self.corpus_file = corpus_file
+        self.meta = manifest if manifest is not None else load_manifest(corpus_file)
+        self.num_terms = self.meta["num_terms"]
+
+    def __len__(self):
+        return self.meta["num_docs"]
+
+    def __iter__(self):
+        base = CSRCorpus.CSRCorpus(path(self.corpus_file, self.meta["base"]))
+        delta_docs, delta_indptr, delta_terms, delta_counts = load_segments(
+            self.corpus_file, self.meta["segments"], self.num_terms)
+        delta_docs = delta_docs.tolist()
+        next_delta = 0
+
+        def delta(k):
+            start, stop = delta_indptr[k], delta_indptr[k + 1]
+            return zip(delta_terms[start:stop].tolist(), delta_counts[start:stop].tolist())
+
+        for doc, document in enumerate(base):
+            if next_delta < len(delta_docs) and delta_docs[next_delta] == doc:
+                counts = dict(document)
+                for term, count in delta(next_delta):
+                    counts[term] = counts.get(term, 0) + count
+                document = sorted(counts.iteritems())
+                next_delta += 1
+            yield document
+        # Appended nodes
+        for k in range(next_delta, len(delta_docs)):
+            yield delta(k)
@@ -0,0 +1,57 @@
+import collections
+from corpus import CompressedCorpus
+from corpus import CSRCorpus
+from corpus import DeltaCorpus
+
+class GraphCorpus(object):
+    '''Node-neighbor corpus read from the binary corpus with its delta
+    segments when updates have been appended, from the binary corpus when
+    one has been built, then from the compressed corpus, otherwise by
+    parsing the text corpus. Documents are sorted unique (term, count) pairs.
+
+    With a binary or compressed corpus, len() and num_terms come from its
+    metadata, so gensim does not need a pass over the corpus to find them.
+    Otherwise len() counts lines and num_terms is None.
+    '''
+    def __init__(self, corpus_file):
+        self.corpus_file = corpus_file
+        if DeltaCorpus.exists(corpus_file):
+            self.reader = DeltaCorpus.DeltaCorpus
+            self.meta = DeltaCorpus.load_manifest(corpus_file)
+        elif CSRCorpus.exists(corpus_file):
+            self.reader = CSRCorpus.CSRCorpus
+            self.meta = CSRCorpus.load_meta(corpus_file)
+        elif CompressedCorpus.exists(corpus_file):
+            self.reader = CompressedCorpus.CompressedCorpus
+            self.meta = CompressedCorpus.load_meta(corpus_file)
+        else:
+            self.reader = None
+            self.meta = None
+        self.num_terms = self.meta["num_terms"] if self.meta is not None else None
+
+    def __len__(self):
+        if self.meta is not None:
+            return self.meta["num_docs"]
+        with open(self.corpus_file, "rb") as f:
+            return sum(1 for line in f)
+
+    def check_num_terms(self, num_terms, name="prior"):
+        '''Raise ValueError if num_terms does not match the corpus.'''
+        if self.num_terms is not None and num_terms != self.num_terms:
+            raise ValueError("%s has %d terms but %s has %d, re-estimate it for the current corpus"
+                             % (name, num_terms, self.corpus_file, self.num_terms))
+
+    def __iter__(self):
+        if self.reader is DeltaCorpus.DeltaCorpus:
+            # Every pass reads the manifest loaded on creation, so len() and
+            # num_terms hold while updates are appended and compacted
+            for document in DeltaCorpus.DeltaCorpus(self.corpus_file, self.meta):
+                yield document
+            return
+        if self.reader is not None:
+            for document in self.reader(self.corpus_file):
+                yield document
+            return
+        for line in open(self.corpus_file, "rb"):
+            counts = collections.Counter(int(v) for v in line.rstrip().split("\t"))
+            yield sorted(counts.iteritems())
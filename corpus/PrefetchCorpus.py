@@ -0,0 +1,87 @@
+import logging
+import Queue
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Sentinel put on the queue after the last chunk
+done = object()
+
+class PrefetchCorpus(object):
+    '''Wrap a corpus so documents are decoded on a background thread.
+
+    Chunks of chunksize documents, gensim's default chunksize, are decoded
+    ahead into a queue holding at most max_chunks chunks. The time the
+    consumer spends waiting for the queue is kept in wait_seconds for the
+    last pass and logged when a pass ends, long waits mean decoding rather
+    than inference is the bottleneck. Other attributes are those of the
+    wrapped corpus.
+    '''
+    def __init__(self, corpus, chunksize=2000, max_chunks=4):
+        self.corpus = corpus
+        self.chunksize = chunksize
+        self.max_chunks = max_chunks
+        self.wait_seconds = 0.0
+        self.total_wait_seconds = 0.0
+
+    def __getattr__(self, name):
+        if name == "corpus":
+            raise AttributeError(name)
+        return getattr(self.corpus, name)
+
+    def __len__(self):
+        return len(self.corpus)
+
+    def produce(self, queue, stop):
+        def put(item):
+            # Give up if the consumer stopped iterating
+            while not stop.is_set():
+                try:
+                    queue.put(item, timeout=0.1)
+                    return True
+                except Queue.Full:
+                    pass
+            return False
+        try:
+            chunk = []
+            for document in self.corpus:
+                chunk.append(document)
+                if len(chunk) == self.chunksize:
+                    if not put(chunk):
+                        return
+                    chunk = []
+            if chunk and not put(chunk):
+                return
+            put(done)
+        except Exception:
+            put(sys.exc_info())
+
+    def __iter__(self):
+        queue = Queue.Queue(self.max_chunks)
+        stop = threading.Event()
+        thread = threading.Thread(target=self.produce, args=(queue, stop))
+        thread.daemon = True
+        thread.start()
+        start = time.time()
+        wait = 0.0
+        chunks = 0
+        try:
+            while True:
+                t = time.time()
+                chunk = queue.get()
+                wait += time.time() - t
+                if chunk is done:
+                    break
+                if isinstance(chunk, tuple):
+                    raise chunk[0], chunk[1], chunk[2]
+                chunks += 1
+                for document in chunk:
+                    yield document
+        finally:
+            stop.set()
+            thread.join()
+            self.wait_seconds = wait
+            self.total_wait_seconds += wait
+            logger.info("prefetch: waited %.2f of %.2f seconds for %d chunks", wait, time.time() - start, chunks)
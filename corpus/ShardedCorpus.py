@@ -0,0 +1,94 @@
+import json
+import os
+import sys
+import numpy as np
+from corpus import CSRCorpus
+
+# A binary corpus split into shards of contiguous documents, balanced by
+# token count so hub nodes do not pile up in one shard. Each shard is a
+# binary corpus of its own, <prefix>-shard<k>, and <prefix>-shards.json
+# lists the document range of every shard.
+
+def index_file(corpus_file):
+    return CSRCorpus.prefix(corpus_file) + "-shards.json"
+
+def shard_file(corpus_file, shard):
+    return "%s-shard%d%s" % (CSRCorpus.prefix(corpus_file), shard, os.path.splitext(corpus_file)[1])
+
+def shard_bounds(indptr, num_shards):
+    '''Document boundaries splitting the entries of indptr into num_shards
+    contiguous ranges of about equal size.
+    '''
+    num_docs = len(indptr) - 1
+    targets = np.arange(1, num_shards) * float(indptr[-1]) / num_shards
+    bounds = np.searchsorted(indptr, targets, side='left')
+    return np.concatenate(([0], np.clip(bounds, 0, num_docs), [num_docs])).astype(np.int64)
+
+def write_shard(corpus_file, index, shard):
+    '''Write one shard listed in the index from the full binary corpus.'''
+    c = CSRCorpus.CSRCorpus(corpus_file)
+    entry = index["shards"][shard]
+    start = entry["first_doc"]
+    stop = start + entry["num_docs"]
+    offset = c.indptr[start]
+    indptr = np.asarray(c.indptr[start:stop + 1]) - offset
+    CSRCorpus.write(
+        shard_file(corpus_file, shard), indptr,
+        c.indices[offset:c.indptr[stop]], c.counts[offset:c.indptr[stop]], c.num_terms)
+
+def write_shards(corpus_file, num_shards):
+    '''Split a binary corpus into shards and write the shard index.'''
+    c = CSRCorpus.CSRCorpus(corpus_file)
+    bounds = shard_bounds(c.indptr, num_shards)
+    index = {
+        "num_docs": len(c),
+        "num_terms": c.num_terms,
+        "shards": [{
+            "file": os.path.basename(shard_file(corpus_file, k)),
+            "first_doc": int(bounds[k]),
+            "num_docs": int(bounds[k + 1] - bounds[k]),
+            "nnz": int(c.indptr[bounds[k + 1]] - c.indptr[bounds[k]]),
+        } for k in range(num_shards)],
+    }
+    for k in range(num_shards):
+        print "  shard %d: documents %d - %d, %d entries" % (
+            k, index["shards"][k]["first_doc"], bounds[k + 1], index["shards"][k]["nnz"])
+        write_shard(corpus_file, index, k)
+    path = index_file(corpus_file)
+    with open(path + ".tmp", "wb") as f:
+        json.dump(index, f, indent=1, sort_keys=True)
+    os.rename(path + ".tmp", path)
+    return index
+
+def load_index(corpus_file):
+    with open(index_file(corpus_file), "rb") as f:
+        return json.load(f)
+
+class ShardedCorpus(object):
+    '''Documents of the given shards, all shards by default, in document order.'''
+    def __init__(self, corpus_file, shards=None):
+        self.corpus_file = corpus_file
+        self.index = load_index(corpus_file)
+        if shards is None:
+            shards = range(len(self.index["shards"]))
+        self.shards = sorted(shards)
+        self.num_terms = self.index["num_terms"]
+
+    def __len__(self):
+        return sum([self.index["shards"][k]["num_docs"] for k in self.shards])
+
+    def first_docs(self):
+        '''Node index of the first document of each selected shard.'''
+        return [self.index["shards"][k]["first_doc"] for k in self.shards]
+
+    def __iter__(self):
+        for k in self.shards:
+            for document in CSRCorpus.CSRCorpus(shard_file(self.corpus_file, k)):
+                yield document
+
+if __name__ == '__main__':
+    # python -m corpus.ShardedCorpus data/networks/flickr-corpus.csv 8
+    corpus_file = sys.argv[1]
+    num_shards = int(sys.argv[2])
+    print "Writing %d shards" % num_shards
+    write_shards(corpus_file, num_shards)
@@ -0,0 +1,231 @@
+import io
+import multiprocessing
+import os
+import numpy as np
+import pandas as pd
+from corpus import CSRCorpus
+import nodedict
+
+# Build node-neighbor corpora from edge lists.
+# Each node is a document whose words are the indexes of its neighbors,
+# optionally preceded by its own index. In the text corpus neighbors keep
+# the order in which their edges appear in the edge file. The binary corpus
+# holds each document as sorted unique (term, count) pairs, where counts
+# are edge multiplicities or summed edge weights.
+
+def read_edges(edge_file, delimiter=' ', header=False, comment='#', weighted=False):
+    '''Read an edge list into int64 source and target arrays, and with
+    weighted a float64 array of weights from the third column.
+    '''
+    try:
+        edges = pd.read_csv(
+            edge_file, sep=delimiter, header=None, skiprows=1 if header else 0,
+            comment=comment, usecols=[0, 1, 2] if weighted else [0, 1],
+            dtype={0: np.int64, 1: np.int64, 2: np.float64})
+    except pd.errors.EmptyDataError:
+        # Only comments
+        empty = np.zeros(0, dtype=np.int64)
+        return (empty, empty, np.zeros(0) if weighted else None)
+    weight = edges[2].values if weighted else None
+    return (edges[0].values, edges[1].values, weight)
+
+def chunk_offsets(edge_file, chunk_bytes, header=False):
+    '''Byte offsets splitting an edge file into chunks of whole lines.
+    Chunk i is offsets[i]:offsets[i+1], the header line is excluded.
+    '''
+    size = os.path.getsize(edge_file)
+    offsets = []
+    with open(edge_file, "rb") as f_edges:
+        if header:
+            f_edges.readline()
+        offset = f_edges.tell()
+        while offset < size:
+            offsets.append(offset)
+            f_edges.seek(min(offset + chunk_bytes, size))
+            f_edges.readline()
+            offset = f_edges.tell()
+    offsets.append(size)
+    return offsets
+
+def read_chunk(task):
+    edge_file, start, stop, delimiter, comment, weighted = task
+    with open(edge_file, "rb") as f_edges:
+        f_edges.seek(start)
+        data = f_edges.read(stop - start)
+    return read_edges(io.BytesIO(data), delimiter, False, comment, weighted)
+
+def read_edges_parallel(edge_file, delimiter=' ', header=False, comment='#', weighted=False,
+                        processes=None, chunk_bytes=2**26):
+    '''read_edges with chunks of the file parsed in a process pool.
+    Edges are returned in file order.
+    '''
+    offsets = chunk_offsets(edge_file, chunk_bytes, header)
+    tasks = [(edge_file, start, stop, delimiter, comment, weighted) for start, stop in zip(offsets[:-1], offsets[1:])]
+    pool = multiprocessing.Pool(processes)
+    try:
+        chunks = []
+        for i, chunk in enumerate(pool.imap(read_chunk, tasks)):
+            print "  chunk %d of %d: %d edges" % (i + 1, len(tasks), len(chunk[0]))
+            chunks.append(chunk)
+    finally:
+        pool.close()
+        pool.join()
+    if not chunks:
+        return read_chunk((edge_file, 0, 0, delimiter, comment, weighted))
+    weight = np.concatenate([c[2] for c in chunks]) if weighted else None
+    return (np.concatenate([c[0] for c in chunks]), np.concatenate([c[1] for c in chunks]), weight)
+
+def build_csr(source, target, weight=None):
+    '''Build the symmetric adjacency of an edge list.
+    Returns (ids, indptr, indices, counts) where ids are the sorted node ids
+    and the neighbors of node index i are indices[indptr[i]:indptr[i+1]].
+    Counts are the edge weights, or ones for an unweighted edge list.
+    '''
+    # Interleave both directions so every node's neighbors keep edge order
+    endpoints = np.empty(2 * len(source), dtype=np.int64)
+    endpoints[0::2] = source
+    endpoints[1::2] = target
+    ids, first = np.unique(endpoints, return_inverse=True)
+    second = np.empty_like(first)
+    second[0::2] = first[1::2]
+    second[1::2] = first[0::2]
+    # Keys are unique, so any sort of them is stable in edge order
+    order = np.argsort(first * len(first) + np.arange(len(first)))
+    indices = second[order]
+    if weight is None:
+        counts = np.ones(len(indices), dtype=np.int32)
+    else:
+        counts = np.repeat(weight, 2)[order]
+    indptr = np.zeros(len(ids) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(first, minlength=len(ids)), out=indptr[1:])
+    return (ids, indptr, indices, counts)
+
+def write_dict(dict_file, ids, block_rows=2**20):
+    '''Write the node_index,node_id csv and replace its id cache, so a
+    cache of a previous build is never used.
+    '''
+    with open(dict_file, "wb") as f_dict:
+        f_dict.write("node_index,node_id\n")
+        for start in range(0, len(ids), block_rows):
+            block = ids[start:start + block_rows].tolist()
+            f_dict.write("".join(["%d,%d\n" % (start + i, node_id) for i, node_id in enumerate(block)]))
+    nodedict.save_cache(dict_file, ids)
+
+def write_documents(f_corpus, indptr, indices, self_token=True, first_doc=0, block_tokens=2**18):
+    '''Write one tab separated line of node indexes per document to an open
+    file, where the first document is node index first_doc. Documents are
+    formatted in blocks of about block_tokens indexes.
+    '''
+    num_docs = len(indptr) - 1
+    start = 0
+    while start < num_docs:
+        stop = np.searchsorted(indptr, indptr[start] + block_tokens, side='right') - 1
+        stop = min(max(stop, start + 1), num_docs)
+        offset = indptr[start]
+        tokens = map(str, indices[offset:indptr[stop]].tolist())
+        bounds = (indptr[start:stop + 1] - offset).tolist()
+        lines = []
+        for i in range(stop - start):
+            document = tokens[bounds[i]:bounds[i + 1]]
+            if self_token:
+                document = [str(first_doc + start + i)] + document
+            lines.append("\t".join(document) + "\n")
+        f_corpus.write("".join(lines))
+        start = stop
+
+def write_text_corpus(corpus_file, indptr, indices, self_token=True, block_tokens=2**18):
+    with open(corpus_file, "wb") as f_corpus:
+        write_documents(f_corpus, indptr, indices, self_token, 0, block_tokens)
+
+def add_self_tokens(indptr, indices, counts, first_doc=0):
+    '''Insert each document's own index, with count 1, before its neighbors.
+    The first document is node index first_doc.
+    '''
+    num_docs = len(indptr) - 1
+    new_indptr = indptr + np.arange(num_docs + 1)
+    is_self = np.zeros(len(indices) + num_docs, dtype=bool)
+    is_self[new_indptr[:-1]] = True
+    new_indices = np.empty(len(is_self), dtype=indices.dtype)
+    new_indices[is_self] = np.arange(first_doc, first_doc + num_docs)
+    new_indices[~is_self] = indices
+    new_counts = np.ones(len(is_self), dtype=counts.dtype)
+    new_counts[~is_self] = counts
+    return (new_indptr, new_indices, new_counts)
+
+def aggregate(indptr, indices, counts, num_terms):
+    '''Merge repeated terms of each document into sorted unique (term, count).'''
+    num_docs = len(indptr) - 1
+    docs = np.repeat(np.arange(num_docs, dtype=np.int64), np.diff(indptr))
+    keys, inverse = np.unique(docs * num_terms + indices, return_inverse=True)
+    totals = np.bincount(inverse, weights=counts, minlength=len(keys))
+    if counts.dtype.kind in "iu":
+        totals = totals.astype(counts.dtype)
+    new_indptr = np.zeros(num_docs + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys // num_terms, minlength=num_docs), out=new_indptr[1:])
+    return (new_indptr, keys % num_terms, totals)
+
+def write_binary_corpus(corpus_file, indptr, indices, counts, self_token=True):
+    '''Write the binary corpus holding the documents of the text corpus as
+    sorted unique (term, count) pairs.
+    '''
+    num_terms = len(indptr) - 1
+    if self_token:
+        indptr, indices, counts = add_self_tokens(indptr, indices, counts)
+    CSRCorpus.write(corpus_file, *aggregate(indptr, indices, counts, num_terms), num_terms=num_terms,
+                    self_token=self_token)
+
+def text_to_binary(corpus_file):
+    '''Build the binary corpus for an existing text corpus.'''
+    remove_updates(corpus_file)
+    lengths = []
+    indices = []
+    with open(corpus_file, "rb") as f_corpus:
+        for line in f_corpus:
+            nodes = line.rstrip().split("\t")
+            lengths.append(len(nodes))
+            indices.append(np.array(nodes, dtype=np.int32))
+    indptr = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=indptr[1:])
+    indices = np.concatenate(indices) if indices else np.zeros(0, dtype=np.int32)
+    num_terms = max(len(lengths), indices.max() + 1 if len(indices) else 0)
+    counts = np.ones(len(indices), dtype=np.int32)
+    CSRCorpus.write(corpus_file, *aggregate(indptr, indices, counts, num_terms), num_terms=num_terms)
+
+def remove_updates(corpus_file):
+    # DeltaCorpus builds on this module, so import it here
+    from corpus import DeltaCorpus
+    DeltaCorpus.remove_updates(corpus_file)
+
+def edges_to_corpus(edge_file, corpus_file, dict_file, delimiter=' ', header=False, comment='#', self_token=True,
+                    weighted=False, processes=1, memory_mb=None):
+    '''Build the dictionary, text corpus and binary corpus for an edge list.
+    With self_token, each document starts with the node's own index.
+    With weighted, binary corpus counts are summed weights from the third
+    column, the text corpus lists neighbors only.
+    With processes other than 1, the edge file is parsed in a process pool,
+    None uses every core.
+    With memory_mb, the corpus is built out of core within about that much
+    working memory, see corpus/external.py.
+    Updates appended to a previous build are removed, see corpus/DeltaCorpus.py.
+    '''
+    remove_updates(corpus_file)
+    if memory_mb:
+        from corpus import external
+        return external.edges_to_corpus(
+            edge_file, corpus_file, dict_file, delimiter, header, comment, self_token, weighted, memory_mb)
+    print "Reading edges"
+    if processes == 1:
+        source, target, weight = read_edges(edge_file, delimiter, header, comment, weighted)
+    else:
+        source, target, weight = read_edges_parallel(edge_file, delimiter, header, comment, weighted, processes)
+    print "  %d edges" % len(source)
+    print "Creating mapping"
+    ids, indptr, indices, counts = build_csr(source, target, weight)
+    print "  %d node_ids, %d - %d" % (len(ids), ids[0], ids[-1])
+    print "Writing dict"
+    write_dict(dict_file, ids)
+    print "Writing corpus"
+    write_text_corpus(corpus_file, indptr, indices, self_token)
+    print "Writing binary corpus"
+    write_binary_corpus(corpus_file, indptr, indices, counts, self_token)
+    return (ids, indptr, indices, counts)
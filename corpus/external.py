@@ -0,0 +1,144 @@
+import itertools
+import os
+import shutil
+import tempfile
+import numpy as np
+from corpus import builder
+from corpus import CSRCorpus
+
+# Out-of-core corpus build for edge lists whose adjacency does not fit in
+# memory. Only the sorted node ids are held in memory. The edge file is
+# read in chunks; both directions of each chunk's edges are sorted into a
+# run on disk, and the runs are merged in windows into the corpus files.
+# Each endpoint is keyed by document * num_endpoints + position in the
+# edge file, so output is identical to builder.edges_to_corpus.
+
+# Approximate bytes of working memory per endpoint while sorting a run
+bytes_per_endpoint = 64
+
+def read_chunks(edge_file, delimiter, header, comment, weighted, chunk_bytes):
+    offsets = builder.chunk_offsets(edge_file, chunk_bytes, header)
+    for start, stop in zip(offsets[:-1], offsets[1:]):
+        yield builder.read_chunk((edge_file, start, stop, delimiter, comment, weighted))
+
+def collect_ids(chunks):
+    '''Sorted unique node ids and the number of edges.'''
+    ids = np.zeros(0, dtype=np.int64)
+    num_edges = 0
+    for source, target, weight in chunks:
+        ids = np.union1d(ids, np.unique(np.concatenate((source, target))))
+        num_edges += len(source)
+    return (ids, num_edges)
+
+def write_runs(chunks, ids, num_edges, run_dir):
+    '''Write a sorted run of (key, neighbor, weight) per chunk, return the run
+    file prefixes.
+    '''
+    num_endpoints = 2 * num_edges
+    runs = []
+    offset = 0
+    for source, target, weight in chunks:
+        n = len(source)
+        if n == 0:
+            continue
+        first = np.empty(2 * n, dtype=np.int64)
+        first[0::2] = np.searchsorted(ids, source)
+        first[1::2] = np.searchsorted(ids, target)
+        second = np.empty_like(first)
+        second[0::2] = first[1::2]
+        second[1::2] = first[0::2]
+        keys = first * num_endpoints + np.arange(offset, offset + 2 * n)
+        del first
+        order = np.argsort(keys)
+        run = os.path.join(run_dir, "run%d" % len(runs))
+        np.save(run + "-keys.npy", keys[order])
+        np.save(run + "-neighbors.npy", second[order])
+        if weight is not None:
+            np.save(run + "-weights.npy", np.repeat(weight, 2)[order])
+        runs.append(run)
+        offset += 2 * n
+    return runs
+
+def merge_runs(runs, weighted, window):
+    '''Yield (keys, neighbors, weights) blocks in key order from sorted runs.
+    Each step takes a window from every run and emits all entries up to the
+    smallest last key among the windows.
+    '''
+    keys = [np.load(run + "-keys.npy", mmap_mode="r") for run in runs]
+    neighbors = [np.load(run + "-neighbors.npy", mmap_mode="r") for run in runs]
+    weights = [np.load(run + "-weights.npy", mmap_mode="r") for run in runs] if weighted else None
+    pos = [0] * len(runs)
+    while True:
+        active = [r for r in range(len(runs)) if pos[r] < len(keys[r])]
+        if not active:
+            break
+        bound = min([keys[r][min(pos[r] + window, len(keys[r])) - 1] for r in active])
+        parts = []
+        for r in active:
+            stop = pos[r] + np.searchsorted(keys[r][pos[r]:pos[r] + window], bound, side='right')
+            parts.append((r, pos[r], stop))
+            pos[r] = stop
+        block_keys = np.concatenate([keys[r][a:b] for r, a, b in parts])
+        order = np.argsort(block_keys)
+        block_neighbors = np.concatenate([neighbors[r][a:b] for r, a, b in parts])[order]
+        block_weights = np.concatenate([weights[r][a:b] for r, a, b in parts])[order] if weighted else None
+        yield (block_keys[order], block_neighbors, block_weights)
+
+def write_corpus(blocks, corpus_file, num_docs, num_endpoints, self_token, weighted):
+    '''Write the text and binary corpus from merged blocks, holding back the
+    last document of a block until it is complete.
+    '''
+    writer = CSRCorpus.CSRWriter(corpus_file, num_docs, weighted, self_token)
+    pending = None
+    with open(corpus_file, "wb") as f_corpus:
+        for block in itertools.chain(blocks, [None]):
+            if block is not None:
+                if pending is not None:
+                    block = tuple(np.concatenate(x) if x[0] is not None else None for x in zip(pending, block))
+                docs = block[0] // num_endpoints
+                complete = np.searchsorted(docs, docs[-1])
+                pending = tuple(x[complete:] if x is not None else None for x in block)
+                block = tuple(x[:complete] if x is not None else None for x in block)
+            else:
+                block = pending
+            if block is None or len(block[0]) == 0:
+                continue
+            docs = block[0] // num_endpoints
+            first_doc = docs[0]
+            indptr = np.zeros(docs[-1] - first_doc + 2, dtype=np.int64)
+            np.cumsum(np.bincount(docs - first_doc), out=indptr[1:])
+            indices = block[1]
+            counts = block[2] if weighted else np.ones(len(indices), dtype=np.int32)
+            builder.write_documents(f_corpus, indptr, indices, self_token, first_doc)
+            if self_token:
+                indptr, indices, counts = builder.add_self_tokens(indptr, indices, counts, first_doc)
+            writer.append(*builder.aggregate(indptr, indices, counts, num_docs))
+    writer.close()
+
+def edges_to_corpus(edge_file, corpus_file, dict_file, delimiter=' ', header=False, comment='#', self_token=True,
+                    weighted=False, memory_mb=1024, tmp_dir=None):
+    '''builder.edges_to_corpus using about memory_mb of working memory beyond
+    the node ids. Sorted runs are written under tmp_dir.
+    '''
+    budget = int(memory_mb * 2**20) // bytes_per_endpoint
+    # An edge line takes at least 4 bytes and gives 2 endpoints
+    chunk_bytes = max(2 * budget, 2**12)
+    run_dir = tempfile.mkdtemp(prefix="corpus-runs-", dir=tmp_dir)
+    try:
+        print "Collecting node ids"
+        ids, num_edges = collect_ids(read_chunks(edge_file, delimiter, header, comment, weighted, chunk_bytes))
+        print "  %d edges" % num_edges
+        print "  %d node_ids, %d - %d" % (len(ids), ids[0], ids[-1])
+        print "Writing dict"
+        builder.write_dict(dict_file, ids)
+        print "Writing sorted runs"
+        runs = write_runs(
+            read_chunks(edge_file, delimiter, header, comment, weighted, chunk_bytes), ids, num_edges, run_dir)
+        print "  %d runs" % len(runs)
+        print "Merging runs into corpus"
+        window = max(budget // (len(runs) + 1), 64)
+        blocks = merge_runs(runs, weighted, window)
+        write_corpus(blocks, corpus_file, len(ids), 2 * num_edges, self_token, weighted)
+    finally:
+        shutil.rmtree(run_dir)
+    return ids
@@ -0,0 +1,423 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from corpus import builder
+from corpus import CompressedCorpus
+from corpus import CSRCorpus
+from corpus import DeltaCorpus
+from corpus import GraphCorpus
+from corpus import PrefetchCorpus
+from corpus import ShardedCorpus
+from corpus import external
+import nodedict
+
+def loop_edges_to_corpus(edge_file, corpus_file, dict_file, delimiter, header, self_token):
+    '''The original per-dataset edges_to_corpus loop.'''
+    edges = {}
+    with open(edge_file, "rb") as f_edges:
+        if header:
+            f_edges.next()
+        for row in f_edges:
+            if row[0] == "#":
+                continue
+            source, target = [int(v) for v in row.rstrip().split(delimiter)]
+            edges.setdefault(source, []).append(target)
+            edges.setdefault(target, []).append(source)
+    id_order = sorted(edges.keys())
+    id_to_index = dict((node_id, i) for i, node_id in enumerate(id_order))
+    with open(dict_file, "wb") as f_dict:
+        f_dict.write("node_index,node_id\n")
+        for i, node_id in enumerate(id_order):
+            f_dict.write("%d,%d\n" % (i, node_id))
+    with open(corpus_file, "wb") as f_corpus:
+        for i, node_id in enumerate(id_order):
+            node_indexes = [str(id_to_index[v]) for v in edges[node_id]]
+            if self_token:
+                node_indexes = [str(i)] + node_indexes
+            f_corpus.write("\t".join(node_indexes) + "\n")
+
+class TestBuilder(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        rs = np.random.RandomState(0)
+        # Sparse ids with duplicate edges and self loops
+        self.edges = rs.choice([3, 7, 10, 11, 50, 1000, 123456789], size=(200, 2))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def path(self, name):
+        return os.path.join(self.tmp, name)
+
+    def write_edges(self, delimiter, header):
+        with open(self.path("edges.csv"), "wb") as f:
+            if header:
+                f.write("source%starget\n" % delimiter)
+            f.write("# comment\n")
+            for i, (source, target) in enumerate(self.edges):
+                if i == 100:
+                    f.write("# another comment\n")
+                f.write("%d%s%d\n" % (source, delimiter, target))
+
+    def compare(self, delimiter, header, self_token):
+        self.write_edges(delimiter, header)
+        loop_edges_to_corpus(
+            self.path("edges.csv"), self.path("loop-corpus.csv"), self.path("loop-dict.csv"),
+            delimiter, header, self_token)
+        builder.edges_to_corpus(
+            self.path("edges.csv"), self.path("corpus.csv"), self.path("dict.csv"),
+            delimiter=delimiter, header=header, self_token=self_token)
+        for name in ["corpus.csv", "dict.csv"]:
+            with open(self.path(name), "rb") as f:
+                built = f.read()
+            with open(self.path("loop-" + name), "rb") as f:
+                expected = f.read()
+            self.assertEqual(built, expected)
+
+    def test_space(self):
+        self.compare(' ', False, True)
+
+    def test_header(self):
+        self.compare(',', True, True)
+
+    def test_no_self(self):
+        self.compare('\t', False, False)
+
+    def test_parallel(self):
+        self.write_edges(',', True)
+        expected = builder.read_edges(self.path("edges.csv"), ',', True)
+        for chunk_bytes in [1, 50, 10**6]:
+            edges = builder.read_edges_parallel(self.path("edges.csv"), ',', True, processes=2, chunk_bytes=chunk_bytes)
+            np.testing.assert_array_equal(edges[0], expected[0])
+            np.testing.assert_array_equal(edges[1], expected[1])
+
+    def test_blocks(self):
+        ids, indptr, indices, counts = builder.build_csr(self.edges[:,0], self.edges[:,1])
+        builder.write_text_corpus(self.path("a.csv"), indptr, indices, block_tokens=3)
+        builder.write_text_corpus(self.path("b.csv"), indptr, indices)
+        with open(self.path("a.csv"), "rb") as a, open(self.path("b.csv"), "rb") as b:
+            self.assertEqual(a.read(), b.read())
+
+class TestCSRCorpus(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.edge_file = os.path.join(self.tmp, "edges.csv")
+        self.corpus_file = os.path.join(self.tmp, "corpus.csv")
+        rs = np.random.RandomState(1)
+        np.savetxt(self.edge_file, rs.randint(0, 30, size=(100, 2)), fmt="%d")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def text_documents(self):
+        c = GraphCorpus.GraphCorpus(self.corpus_file)
+        self.assertFalse(CSRCorpus.exists(self.corpus_file))
+        return list(c)
+
+    def test_binary(self):
+        for self_token in [True, False]:
+            builder.edges_to_corpus(
+                self.edge_file, self.corpus_file, os.path.join(self.tmp, "dict.csv"), self_token=self_token)
+            os.rename(CSRCorpus.meta_file(self.corpus_file), self.corpus_file + ".meta")
+            expected = self.text_documents()
+            os.rename(self.corpus_file + ".meta", CSRCorpus.meta_file(self.corpus_file))
+            self.assertEqual(list(GraphCorpus.GraphCorpus(self.corpus_file)), expected)
+            self.assertEqual(list(CSRCorpus.CSRCorpus(self.corpus_file, block_entries=5)), expected)
+            self.assertEqual(CSRCorpus.CSRCorpus(self.corpus_file)[3], expected[3])
+
+    def test_meta(self):
+        builder.edges_to_corpus(self.edge_file, self.corpus_file, os.path.join(self.tmp, "dict.csv"))
+        c = GraphCorpus.GraphCorpus(self.corpus_file)
+        documents = list(c)
+        self.assertEqual(len(c), len(documents))
+        self.assertEqual(c.num_terms, 30)
+        self.assertEqual(c.meta["nnz"], sum(len(d) for d in documents))
+        self.assertEqual(sum(c.meta["degree_histogram"]), len(documents))
+        self.assertEqual(c.meta["sha1"], CSRCorpus.content_hash(self.corpus_file))
+        c.check_num_terms(30)
+        self.assertRaises(ValueError, c.check_num_terms, 29)
+        np.testing.assert_array_equal(CSRCorpus.degree_histogram(np.array([0, 0, 1, 3, 6, 10])), [1, 1, 2, 1])
+
+    def test_text_to_binary(self):
+        builder.edges_to_corpus(self.edge_file, self.corpus_file, os.path.join(self.tmp, "dict.csv"))
+        arrays = [np.load(CSRCorpus.array_file(self.corpus_file, name)) for name in CSRCorpus.arrays]
+        builder.text_to_binary(self.corpus_file)
+        for name, expected in zip(CSRCorpus.arrays, arrays):
+            np.testing.assert_array_equal(np.load(CSRCorpus.array_file(self.corpus_file, name)), expected)
+
+    def test_aggregate(self):
+        with open(self.edge_file, "wb") as f:
+            f.write("1 2 0.5\n2 1 0.25\n1 1 2.0\n5 1 1.0\n")
+        dict_file = os.path.join(self.tmp, "dict.csv")
+        builder.edges_to_corpus(self.edge_file, self.corpus_file, dict_file)
+        c = CSRCorpus.CSRCorpus(self.corpus_file)
+        self.assertEqual(list(c), [[(0, 3), (1, 2), (2, 1)], [(0, 2), (1, 1)], [(0, 1), (2, 1)]])
+        builder.edges_to_corpus(self.edge_file, self.corpus_file, dict_file, weighted=True)
+        c = CSRCorpus.CSRCorpus(self.corpus_file)
+        self.assertTrue(c.meta["weighted"])
+        self.assertEqual(list(c), [[(0, 5.0), (1, 0.75), (2, 1.0)], [(0, 0.75), (1, 1.0)], [(0, 1.0), (2, 1.0)]])
+
+class TestExternal(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.edge_file = os.path.join(self.tmp, "edges.csv")
+        rs = np.random.RandomState(2)
+        edges = rs.randint(0, 300, size=(3000, 2))
+        with open(self.edge_file, "wb") as f:
+            f.write("# comment\n")
+            for source, target in edges:
+                f.write("%d %d %.3f\n" % (source, target, rs.rand()))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def read(self, name):
+        with open(os.path.join(self.tmp, name), "rb") as f:
+            return f.read()
+
+    def test_identical(self):
+        for self_token, weighted in [(True, False), (False, True)]:
+            builder.edges_to_corpus(
+                self.edge_file, os.path.join(self.tmp, "a.csv"), os.path.join(self.tmp, "a-dict.csv"),
+                self_token=self_token, weighted=weighted)
+            external.edges_to_corpus(
+                self.edge_file, os.path.join(self.tmp, "b.csv"), os.path.join(self.tmp, "b-dict.csv"),
+                self_token=self_token, weighted=weighted, memory_mb=0.001, tmp_dir=self.tmp)
+            self.assertEqual(self.read("a.csv"), self.read("b.csv"))
+            self.assertEqual(self.read("a-dict.csv"), self.read("b-dict.csv"))
+            for name in CSRCorpus.arrays + ["meta"]:
+                suffix = ".json" if name == "meta" else ".npy"
+                self.assertEqual(self.read("a-%s%s" % (name, suffix)), self.read("b-%s%s" % (name, suffix)))
+            self.assertEqual(sorted(os.listdir(self.tmp)), sorted(
+                ["edges.csv", "a.csv", "a-dict.csv", "b.csv", "b-dict.csv"] +
+                ["%s-dict.csv%s" % (p, suffix) for p in "ab" for suffix in [".npy", ".json"]] +
+                ["%s-%s.npy" % (p, n) for p in "ab" for n in CSRCorpus.arrays] + ["a-meta.json", "b-meta.json"]))
+
+class TestShardedCorpus(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.corpus_file = os.path.join(self.tmp, "corpus.csv")
+        rs = np.random.RandomState(3)
+        # A few hubs among many small documents
+        lengths = rs.randint(1, 5, size=50)
+        lengths[[3, 20]] = 100
+        indptr = np.concatenate(([0], np.cumsum(lengths)))
+        indices = rs.randint(0, 50, size=indptr[-1])
+        builder.write_binary_corpus(self.corpus_file, indptr, indices, np.ones(len(indices), dtype=np.int32))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_bounds(self):
+        indptr = np.array([0, 10, 11, 12, 13, 23, 24])
+        np.testing.assert_array_equal(ShardedCorpus.shard_bounds(indptr, 2), [0, 3, 6])
+        np.testing.assert_array_equal(ShardedCorpus.shard_bounds(indptr, 1), [0, 6])
+
+    def test_shards(self):
+        index = ShardedCorpus.write_shards(self.corpus_file, 4)
+        expected = list(CSRCorpus.CSRCorpus(self.corpus_file))
+        self.assertEqual(list(ShardedCorpus.ShardedCorpus(self.corpus_file)), expected)
+        c = ShardedCorpus.ShardedCorpus(self.corpus_file, [2, 1])
+        start = index["shards"][1]["first_doc"]
+        self.assertEqual(list(c), expected[start:start + len(c)])
+        self.assertEqual(c.first_docs(), [start, index["shards"][2]["first_doc"]])
+        nnz = [s["nnz"] for s in index["shards"]]
+        self.assertEqual(sum(nnz), CSRCorpus.CSRCorpus(self.corpus_file).meta["nnz"])
+
+class TestPrefetchCorpus(unittest.TestCase):
+
+    def setUp(self):
+        self.documents = [[(i, 1), (i + 1, 2)] for i in range(25)]
+
+    def test_documents(self):
+        c = PrefetchCorpus.PrefetchCorpus(self.documents, chunksize=4, max_chunks=2)
+        self.assertEqual(len(c), 25)
+        self.assertEqual(list(c), self.documents)
+        self.assertEqual(list(c), self.documents)
+        self.assertTrue(c.wait_seconds >= 0)
+
+    def test_partial(self):
+        c = PrefetchCorpus.PrefetchCorpus(self.documents, chunksize=2, max_chunks=1)
+        for i, document in enumerate(c):
+            if i == 3:
+                break
+        self.assertEqual(list(c), self.documents)
+
+    def test_error(self):
+        def documents():
+            yield [(0, 1)]
+            raise IOError("bad corpus")
+        class Corpus(object):
+            def __iter__(self):
+                return documents()
+        c = PrefetchCorpus.PrefetchCorpus(Corpus(), chunksize=1)
+        self.assertRaises(IOError, list, c)
+
+class TestCompressedCorpus(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.corpus_file = os.path.join(self.tmp, "corpus.csv")
+        edge_file = os.path.join(self.tmp, "edges.csv")
+        rs = np.random.RandomState(4)
+        np.savetxt(edge_file, np.column_stack((rs.randint(0, 100, size=(500, 2)), rs.rand(500))), fmt="%d %d %.4f")
+        builder.edges_to_corpus(edge_file, self.corpus_file, os.path.join(self.tmp, "dict.csv"), weighted=True)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_codecs(self):
+        expected = list(CSRCorpus.CSRCorpus(self.corpus_file))
+        for codec in ["zlib", "bz2"]:
+            CompressedCorpus.write(self.corpus_file, block_docs=7, codec=codec)
+            c = CompressedCorpus.CompressedCorpus(self.corpus_file)
+            self.assertEqual(len(c), len(expected))
+            self.assertEqual(list(c), expected)
+            for doc in [50, 0, 99, 13, 14]:
+                self.assertEqual(c[doc], expected[doc])
+            self.assertRaises(IndexError, c.__getitem__, len(expected))
+
+    def test_graph_corpus(self):
+        expected = list(CSRCorpus.CSRCorpus(self.corpus_file))
+        CompressedCorpus.write(self.corpus_file)
+        os.remove(CSRCorpus.meta_file(self.corpus_file))
+        c = GraphCorpus.GraphCorpus(self.corpus_file)
+        self.assertEqual(c.reader, CompressedCorpus.CompressedCorpus)
+        self.assertEqual(c.num_terms, 100)
+        self.assertEqual(list(c), expected)
+
+class TestDeltaCorpus(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        rs = np.random.RandomState(5)
+        self.edges = rs.randint(0, 40, size=(200, 2))
+        # Later edges touch existing nodes and add nodes with larger ids
+        self.new_edges = [rs.randint(0, 60, size=(30, 2)), rs.randint(0, 70, size=(10, 2))]
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def path(self, name):
+        return os.path.join(self.tmp, name)
+
+    def build(self, name, edges):
+        np.savetxt(self.path(name + "-edges.csv"), edges, fmt="%d")
+        builder.edges_to_corpus(self.path(name + "-edges.csv"), self.path(name + "-corpus.csv"),
+            self.path(name + "-dict.csv"))
+
+    def test_append(self):
+        self.build("base", self.edges)
+        corpus_file = self.path("base-corpus.csv")
+        for edges in self.new_edges:
+            DeltaCorpus.append_edges(corpus_file, self.path("base-dict.csv"), edges[:,0], edges[:,1])
+        self.build("full", np.concatenate([self.edges] + self.new_edges))
+        with open(self.path("base-dict.csv"), "rb") as a, open(self.path("full-dict.csv"), "rb") as b:
+            self.assertEqual(a.read(), b.read())
+        expected = list(CSRCorpus.CSRCorpus(self.path("full-corpus.csv")))
+        c = GraphCorpus.GraphCorpus(corpus_file)
+        self.assertEqual(c.reader, DeltaCorpus.DeltaCorpus)
+        self.assertEqual((len(c), c.num_terms), (len(expected), len(expected)))
+        self.assertEqual(list(c), expected)
+
+        thread = DeltaCorpus.compact_in_background(corpus_file)
+        thread.join()
+        manifest = DeltaCorpus.load_manifest(corpus_file)
+        self.assertEqual(manifest["segments"], [])
+        self.assertEqual(list(GraphCorpus.GraphCorpus(corpus_file)), expected)
+        base_file = DeltaCorpus.path(corpus_file, manifest["base"])
+        for name in CSRCorpus.arrays:
+            np.testing.assert_array_equal(
+                np.load(CSRCorpus.array_file(base_file, name)),
+                np.load(CSRCorpus.array_file(self.path("full-corpus.csv"), name)))
+        # Kept for readers of the previous manifest until the next compaction
+        self.assertEqual(manifest["retired"][0]["segments"], [os.path.basename(DeltaCorpus.segment_file(corpus_file, i))
+                                                              for i in range(2)])
+        self.assertTrue(CSRCorpus.exists(DeltaCorpus.segment_file(corpus_file, 0)))
+
+    def test_self_token(self):
+        # Appends follow the build, here without self tokens as for LJ
+        for name, edges in [("base", self.edges), ("full", np.concatenate([self.edges] + self.new_edges))]:
+            np.savetxt(self.path(name + "-edges.csv"), edges, fmt="%d")
+            builder.edges_to_corpus(self.path(name + "-edges.csv"), self.path(name + "-corpus.csv"),
+                self.path(name + "-dict.csv"), self_token=False)
+        corpus_file = self.path("base-corpus.csv")
+        for edges in self.new_edges:
+            DeltaCorpus.append_edges(corpus_file, self.path("base-dict.csv"), edges[:,0], edges[:,1])
+        self.assertEqual(list(GraphCorpus.GraphCorpus(corpus_file)),
+                         list(CSRCorpus.CSRCorpus(self.path("full-corpus.csv"))))
+        edges = self.new_edges[0]
+        self.assertRaises(ValueError, DeltaCorpus.append_edges, corpus_file, self.path("base-dict.csv"),
+                          edges[:,0], edges[:,1], self_token=True)
+        # A corpus built before self_token was recorded needs it on the first append
+        builder.text_to_binary(self.path("full-corpus.csv"))
+        self.assertRaises(ValueError, DeltaCorpus.append_edges, self.path("full-corpus.csv"),
+                          self.path("full-dict.csv"), edges[:,0], edges[:,1])
+        DeltaCorpus.append_edges(self.path("full-corpus.csv"), self.path("full-dict.csv"), edges[:,0], edges[:,1],
+                                 self_token=False)
+        self.assertEqual(DeltaCorpus.load_manifest(self.path("full-corpus.csv"))["self_token"], False)
+
+    def test_pinned_reader(self):
+        self.build("base", self.edges)
+        corpus_file = self.path("base-corpus.csv")
+        dict_file = self.path("base-dict.csv")
+        DeltaCorpus.append_edges(corpus_file, dict_file, self.new_edges[0][:,0], self.new_edges[0][:,1])
+        c = GraphCorpus.GraphCorpus(corpus_file)
+        expected = list(c)
+        DeltaCorpus.compact(corpus_file)
+        DeltaCorpus.append_edges(corpus_file, dict_file, self.new_edges[1][:,0], self.new_edges[1][:,1])
+        # Passes read the manifest the corpus was created with
+        self.assertEqual(list(c), expected)
+        self.assertEqual(len(c), len(expected))
+        self.assertTrue(max(term for document in c for term, count in document) < c.num_terms)
+        DeltaCorpus.compact(corpus_file)
+        # Files replaced by the first compaction are deleted, those of the second kept
+        self.assertFalse(CSRCorpus.exists(DeltaCorpus.segment_file(corpus_file, 0)))
+        self.assertTrue(CSRCorpus.exists(DeltaCorpus.generation_file(corpus_file, 1)))
+        self.assertTrue(CSRCorpus.exists(DeltaCorpus.segment_file(corpus_file, 1)))
+        self.assertEqual(list(GraphCorpus.GraphCorpus(corpus_file)), list(DeltaCorpus.DeltaCorpus(corpus_file)))
+
+    def test_rebuild(self):
+        # A full rebuild replaces appended and compacted updates
+        self.build("base", self.edges)
+        corpus_file = self.path("base-corpus.csv")
+        DeltaCorpus.append_edges(corpus_file, self.path("base-dict.csv"), self.new_edges[0][:,0], self.new_edges[0][:,1])
+        DeltaCorpus.compact(corpus_file)
+        DeltaCorpus.append_edges(corpus_file, self.path("base-dict.csv"), self.new_edges[1][:,0], self.new_edges[1][:,1])
+        self.build("base", self.new_edges[1])
+        self.build("full", self.new_edges[1])
+        self.assertFalse(DeltaCorpus.exists(corpus_file))
+        self.assertEqual([name for name in os.listdir(self.tmp) if "-gen" in name or "-delta" in name],
+                         [os.path.basename(DeltaCorpus.lock_file(corpus_file))])
+        self.assertTrue(os.path.exists(DeltaCorpus.compact_lock_file(corpus_file)))
+        c = GraphCorpus.GraphCorpus(corpus_file)
+        self.assertEqual(c.reader, CSRCorpus.CSRCorpus)
+        self.assertEqual(list(c), list(CSRCorpus.CSRCorpus(self.path("full-corpus.csv"))))
+        # The id cache of the appended dictionary is replaced too
+        np.testing.assert_array_equal(
+            nodedict.load(self.path("base-dict.csv")).ids, nodedict.load(self.path("full-dict.csv")).ids)
+
+    def test_concurrent_compact(self):
+        self.build("base", self.edges)
+        corpus_file = self.path("base-corpus.csv")
+        for edges in self.new_edges:
+            DeltaCorpus.append_edges(corpus_file, self.path("base-dict.csv"), edges[:,0], edges[:,1])
+        expected = list(GraphCorpus.GraphCorpus(corpus_file))
+        threads = [DeltaCorpus.compact_in_background(corpus_file) for i in range(3)]
+        for thread in threads:
+            thread.join()
+        manifest = DeltaCorpus.load_manifest(corpus_file)
+        self.assertEqual((manifest["generation"], manifest["segments"]), (1, []))
+        self.assertEqual(list(GraphCorpus.GraphCorpus(corpus_file)), expected)
+
+    def test_weighted(self):
+        self.build("base", self.edges)
+        edges = self.new_edges[0]
+        self.assertRaises(ValueError, DeltaCorpus.append_edges,
+            self.path("base-corpus.csv"), self.path("base-dict.csv"), edges[:,0], edges[:,1], np.ones(len(edges)))
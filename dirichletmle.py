@@ -0,0 +1,66 @@
+import time
+
+import numpy as np
+import scipy.sparse as spsparse
+from scipy.special import digamma, polygamma
+
+def mean_log(p, floor=1e-10):
+    '''Mean log-probability of each component over the rows of p.
+    p may be dense or sparse, with one distribution per row. Entries below
+    floor, including entries missing from a sparse matrix, are raised to
+    floor. Empty rows are not counted as samples.
+    '''
+    if not spsparse.issparse(p):
+        p = p[p.sum(axis=1) > 0]
+        return np.log(np.maximum(p, floor)).mean(axis=0)
+    p = p.tocsr()
+    num_rows = np.count_nonzero(np.diff(p.indptr))
+    log_floor = np.log(floor)
+    # Sum the difference from the floor over stored entries only
+    excess = np.log(np.maximum(p.data, floor)) - log_floor
+    total = np.bincount(p.indices, weights=excess, minlength=p.shape[1])
+    return total / float(num_rows) + log_floor
+
+def inv_digamma(y, iterations=5):
+    '''Invert the digamma function with Newton's method (Minka appendix C).'''
+    x = np.where(y >= -2.22, np.exp(y) + 0.5, -1.0 / (y - digamma(1)))
+    for i in range(iterations):
+        x = x - (digamma(x) - y) / polygamma(1, x)
+    return x
+
+def initial_alpha(p, floor=1e-10):
+    '''Moment-matching starting point for the fixed-point iteration.'''
+    if spsparse.issparse(p):
+        p = p.tocsr()
+        num_rows = float(np.count_nonzero(np.diff(p.indptr)))
+        m = np.bincount(p.indices, weights=p.data, minlength=p.shape[1]) / num_rows
+        m2 = np.bincount(p.indices, weights=p.data**2, minlength=p.shape[1]) / num_rows
+    else:
+        p = p[p.sum(axis=1) > 0]
+        m = p.mean(axis=0)
+        m2 = (p**2).mean(axis=0)
+    # Estimate precision from each component's variance, use the median
+    denom = m2 - m**2
+    valid = (denom > 0) & (m > m2)
+    if valid.any():
+        s = np.median((m[valid] - m2[valid]) / denom[valid])
+    else:
+        s = 1.0
+    return np.maximum(m, floor) * s
+
+def mle(p, floor=1e-10, tol=1e-7, maxiter=1000):
+    '''Estimate Dirichlet parameters from the distributions in the rows of p
+    using Minka's fixed-point iteration.
+    '''
+    start = time.time()
+    logp = mean_log(p, floor)
+    alpha = initial_alpha(p, floor)
+    for i in range(maxiter):
+        alpha_new = inv_digamma(digamma(alpha.sum()) + logp)
+        change = np.abs(alpha_new - alpha).max()
+        alpha = alpha_new
+        if change < tol:
+            print "  converged in %d iterations (%.2f seconds)" % (i + 1, time.time() - start)
+            return alpha
+    print "  did not converge in %d iterations (%.2f seconds)" % (maxiter, time.time() - start)
+    return alpha
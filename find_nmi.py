@@ -1,12 +1,13 @@
 import sys
-import pandas as pd
+import membership
 import nmi
 
 test_file = sys.argv[1]
 truth_file = sys.argv[2]
 
-df_test = pd.DataFrame.from_csv(test_file, index_col=None)
-df_truth = pd.DataFrame.from_csv(truth_file, index_col=None)
+# Covers may be csv or binary
+df_test = membership.read_memberships(test_file)
+df_truth = membership.read_memberships(truth_file)
 
 res = nmi.weighted_overlapping(df_test, df_truth)
 
@@ -0,0 +1,59 @@
+# Dataset configurations for lda_run.py, by name. A dataset may also be
+# given to lda_run.py as a json file with the same keys.
+#   corpus                 dotted path of the corpus class
+#   dict_file              node_index,node_id csv
+#   simple_out, _log       % (num_topics, priors[, timestamp])
+#   prior_alpha, _beta     flat prior csvs % base_method
+#   prior_out, _log        % base_method
+#   prior_double_scale     factor for the flat priors when doubling topics
+#   prior_double_alpha     alpha mass of the added topics when doubling
+#   pertopic_alpha, _beta  per-topic prior files % base_method
+#   pertopic_out, _log     % (base_method, priors)
+
+datasets = {
+    "flickr": {
+        "corpus": "corpus.FlickrCorpus.FlickrCorpus",
+        "dict_file": "data/networks/flickr-dict.csv",
+        "simple_out": "output/communities/flickr-simplelda-%d-%s-%s.csv",
+        "simple_log": "logs/gensim-flickr-simple-%d-%s.log",
+        "prior_alpha": "output/priors/flickr-%s-alpha.csv",
+        "prior_beta": "output/priors/flickr-%s-beta.csv",
+        "prior_out": "output/communities/flickr-hybrid-%s.csv",
+        "prior_log": "logs/gensim-flickr-hybrid-%s.log",
+        "prior_double_scale": 1.0,
+        "prior_double_alpha": 50.0,
+        "pertopic_alpha": "output/priors/flickr-%s-alpha-pertopic.csv",
+        "pertopic_beta": "output/priors/flickr-%s-beta-pertopic.npy",
+        "pertopic_out": "output/communities/flickr-hybrid-%s-%s-pertopic.csv",
+        "pertopic_log": "logs/gensim-flickr-hybrid-%s-%s.log",
+    },
+    # Ground truth: 12093
+    "wpusertalk": {
+        "corpus": "corpus.WPCorpus.WPCorpus",
+        "dict_file": "data/networks/wpuser-dict.csv",
+        "simple_out": "output/communities/wpusertalk-simplelda-%d-%s-%s.csv",
+        "simple_log": "logs/gensim-wpusertalk-simple-%d-%s.log",
+        "prior_alpha": "output/priors/wikipedia-%s-alpha.csv",
+        "prior_beta": "output/priors/wikipedia-%s-beta.csv",
+        "prior_out": "output/communities/wpusertalk-hybrid-%s.csv",
+        "prior_log": "logs/gensim-wpusertalk-hybrid-%s.log",
+        "prior_double_scale": 0.5,
+        "prior_double_alpha": 0.5,
+        "pertopic_alpha": "output/priors/wikipedia-%s-alpha-pertopic.csv",
+        "pertopic_beta": "output/priors/wikipedia-%s-beta-pertopic.npy",
+        "pertopic_out": "output/communities/wpusertalk-hybrid-%s-%s-pertopic.csv",
+        "pertopic_log": "logs/gensim-wpusertalk-hybrid-%s-%s.log",
+    },
+}
+
+# LFR benchmarks, lfrN has mixing parameter N / 10
+for mu in [0, 2, 4, 6, 8, 10]:
+    name = "lfr%d" % mu
+    datasets[name] = {
+        "corpus": "corpus.LFR%dCorpus.LFR%dCorpus" % (mu, mu),
+        "dict_file": "data/networks/%s-dict.csv" % name,
+        "pertopic_alpha": "output/priors/%s-%%s-alpha-pertopic.csv" % name,
+        "pertopic_beta": "output/priors/%s-%%s-beta-pertopic.npy" % name,
+        "pertopic_out": "output/communities/%s-hybrid-%%s-%%s-pertopic.csv" % name,
+        "pertopic_log": "logs/gensim-%s-hybrid-%%s-%%s.log" % name,
+    }
@@ -0,0 +1,557 @@
+import argparse
+import copy
+import glob
+import importlib
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+import gensim
+import gensim.models
+import numpy as np
+import pandas as pd
+import communityprior_pertopic
+from corpus import GraphCorpus
+from corpus import PrefetchCorpus
+import lda_datasets
+import membership
+import nodedict
+
+log_format = '%(asctime)s : %(levelname)s : %(message)s'
+
+# Inputs loaded once by sweep, the forked runs inherit them. The corpus and
+# per-topic beta are memory-mapped, so all runs share one copy in memory.
+shared = {}
+
+# Bytes per topic-term entry of one model: gensim keeps sstats, expElogbeta,
+# eta and a lambda copy as float32 K x V arrays, per worker process.
+model_entry_bytes = 16
+
+def load_config(dataset):
+    '''Config of a dataset in lda_datasets, or read from a json file.'''
+    if dataset in lda_datasets.datasets:
+        return lda_datasets.datasets[dataset]
+    with open(dataset, "rb") as f:
+        return json.load(f)
+
+def load_corpus(config):
+    '''Corpus from the config's corpus class, or its corpus_file.'''
+    if "corpus_file" in config:
+        return GraphCorpus.GraphCorpus(config["corpus_file"])
+    module, name = config["corpus"].rsplit(".", 1)
+    return getattr(importlib.import_module(module), name)()
+
+def parse_prior(value):
+    '''sym for gensim's symmetric prior, a number, or a string gensim
+    understands such as auto.
+    '''
+    if value is None or value == 'sym':
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+def double_prior(alpha, scale, added_alpha):
+    '''Flat priors for twice the topics, the added topics share added_alpha.'''
+    num_topics = len(alpha)
+    alpha2 = np.ones(num_topics) * added_alpha / float(num_topics)
+    return np.concatenate((scale * np.asarray(alpha), alpha2))
+
+def double_pertopic(alpha, beta, num_topics):
+    '''Per-topic priors for twice the topics, half of the prior mass going to
+    the added topics. Only prior arrays are extended, sym and numeric priors
+    apply to any number of topics.
+    '''
+    if isinstance(alpha, np.ndarray):
+        print "Extending alpha vector"
+        alpha2 = np.ones(num_topics) * 0.5 / float(num_topics)
+        alpha = np.concatenate((0.5 * alpha, alpha2))
+        print "  new alpha: %d" % len(alpha)
+    if isinstance(beta, np.ndarray):
+        print "Extending beta vector"
+        # Filled in place in the dtype of beta, so no float64 or temporary
+        # K x V arrays are made beyond the doubled prior itself
+        beta2 = np.empty((2 * num_topics, beta.shape[1]), dtype=beta.dtype)
+        np.multiply(beta, 0.5, out=beta2[:num_topics])
+        beta2[num_topics:] = 0.5 / float(num_topics)
+        beta = beta2
+        print "  new beta: %d x %d" % beta.shape
+    return (alpha, beta, num_topics * 2)
+
+def simple_run(config, args):
+    '''Plain LDA with command line priors.'''
+    prior = "%s-%s" % (args.alpha, args.beta)
+    timestamp = time.strftime("%m%dT%H%M")
+    return {
+        "num_topics": args.num_topics,
+        "num_words": None,
+        "alpha": parse_prior(args.alpha),
+        "beta": parse_prior(args.beta),
+        "out_file": config["simple_out"] % (args.num_topics, prior, timestamp),
+        "log_file": config["simple_log"] % (args.num_topics, prior),
+        "log_level": logging.INFO,
+    }
+
+def prior_run(config, args):
+    '''LDA with flat priors estimated by communityprior.py.'''
+    alpha = pd.read_csv(config["prior_alpha"] % args.base_method)['alpha_k'].values
+    beta = pd.read_csv(config["prior_beta"] % args.base_method)['beta_v'].values
+    num_topics = len(alpha)
+    # Double communities for nonoverlapping base methods
+    if args.double == "double":
+        print "Extending alpha vector"
+        scale = config.get("prior_double_scale", 1.0)
+        alpha = double_prior(alpha, scale, config.get("prior_double_alpha", 1.0))
+        beta = scale * beta
+        num_topics = num_topics * 2
+    return {
+        "num_topics": num_topics,
+        "num_words": len(beta),
+        "alpha": alpha,
+        "beta": beta,
+        "out_file": config["prior_out"] % args.base_method,
+        "log_file": config["prior_log"] % args.base_method,
+        "log_level": logging.DEBUG,
+    }
+
+def pertopic_beta_file(config, base_method):
+    '''The per-topic beta file of base_method. Priors written before the
+    binary format have the same name with .csv and are used when there is
+    no .npy file.
+    '''
+    beta_file = config["pertopic_beta"] % base_method
+    text_file = os.path.splitext(beta_file)[0] + ".csv"
+    if not os.path.exists(beta_file) and os.path.exists(text_file):
+        print "No %s, reading the text prior %s" % (beta_file, text_file)
+        return text_file
+    return beta_file
+
+def pertopic_run(config, args):
+    '''LDA with per-topic priors estimated by communityprior_pertopic.py,
+    each of alpha and beta taken from the prior, sym or a number.
+    '''
+    if "beta" in shared:
+        beta = shared["beta"]
+    else:
+        beta = communityprior_pertopic.load_beta(pertopic_beta_file(config, args.base_method))
+    num_topics, num_words = beta.shape
+    print "%d nodes in %d communities" % (num_words, num_topics)
+    if args.alpha == 'prior':
+        alpha = pd.read_csv(config["pertopic_alpha"] % args.base_method)['alpha_k'].values
+    else:
+        alpha = parse_prior(args.alpha)
+    if args.beta != 'prior':
+        beta = parse_prior(args.beta)
+    priors = "%s-%s%s" % (args.alpha, args.beta, args.suffix)
+    # Double communities for nonoverlapping base methods
+    if args.double == "double":
+        alpha, beta, num_topics = double_pertopic(alpha, beta, num_topics)
+    return {
+        "num_topics": num_topics,
+        "num_words": num_words,
+        "alpha": alpha,
+        "beta": beta,
+        "out_file": config["pertopic_out"] % (args.base_method, priors),
+        "log_file": config["pertopic_log"] % (args.base_method, priors),
+        "log_level": logging.DEBUG,
+    }
+
+def train(c, num_topics, alpha, beta, workers=1, seed=None, chunksize=2000, corpus=None):
+    '''LdaModel, or LdaMulticore with workers processes for inference,
+    trained on corpus. Without a corpus the model is only initialized.
+    '''
+    if c.num_terms:
+        id2word = gensim.utils.FakeDict(c.num_terms)
+    elif corpus is None:
+        id2word = gensim.utils.dict_from_corpus(c)
+    else:
+        id2word = None
+    if workers > 1:
+        if alpha is None:
+            alpha = 'symmetric'
+        return gensim.models.LdaMulticore(
+            corpus, id2word=id2word, num_topics=num_topics, workers=workers, alpha=alpha, eta=beta,
+            chunksize=chunksize, random_state=seed)
+    return gensim.models.LdaModel(
+        corpus, id2word=id2word, num_topics=num_topics, alpha=alpha, eta=beta,
+        chunksize=chunksize, random_state=seed)
+
+# Checkpoints of a run are kept next to its output:
+#   <out>-checkpoint.json          position: documents trained so far, the
+#                                  group size and the current model file
+#   <out>-checkpoint<g>.model*     model saved by gensim, with lambda (sstats),
+#                                  alpha, eta and the random state
+# The json is replaced once the new model is saved, so a run killed while
+# saving resumes from the previous checkpoint.
+
+def checkpoint_file(out_file):
+    return os.path.splitext(out_file)[0] + "-checkpoint.json"
+
+def checkpoint_model_file(out_file, generation):
+    return "%s-checkpoint%d.model" % (os.path.splitext(out_file)[0], generation)
+
+def load_checkpoint(out_file):
+    '''The checkpoint position of a run, None if there is none.'''
+    if not os.path.exists(checkpoint_file(out_file)):
+        return None
+    with open(checkpoint_file(out_file), "rb") as f:
+        return json.load(f)
+
+def remove_model(model_file):
+    for path in glob.glob(model_file + ".*") + [model_file]:
+        os.remove(path)
+
+def save_checkpoint(m, out_file, position):
+    previous = load_checkpoint(out_file)
+    generation = previous["generation"] + 1 if previous else 0
+    model_file = checkpoint_model_file(out_file, generation)
+    m.save(model_file)
+    position = dict(position, generation=generation, model=os.path.basename(model_file))
+    path = checkpoint_file(out_file)
+    with open(path + ".tmp", "wb") as f:
+        json.dump(position, f, indent=1, sort_keys=True)
+    os.rename(path + ".tmp", path)
+    if previous:
+        remove_model(os.path.join(os.path.dirname(out_file), previous["model"]))
+
+def remove_checkpoint(out_file):
+    checkpoint = load_checkpoint(out_file)
+    if checkpoint:
+        remove_model(os.path.join(os.path.dirname(out_file), checkpoint["model"]))
+        os.remove(checkpoint_file(out_file))
+
+def update_chunk(m, chunk, chunk_no, num_docs):
+    '''Update an LdaModel on chunk chunk_no of a corpus of num_docs
+    documents as LdaModel.update does in its single pass over the corpus:
+    the step size, the blend into a model of num_docs documents and the
+    perplexity evaluations (which draw from the random state) are the same.
+    '''
+    chunksize = min(num_docs, m.chunksize)
+    end = chunk_no * chunksize + len(chunk)
+    if m.eval_every and (end == num_docs or (chunk_no + 1) % (m.eval_every * m.numworkers) == 0):
+        m.log_perplexity(chunk, total_docs=num_docs)
+    other = gensim.models.ldamodel.LdaState(m.eta, m.state.sstats.shape, m.dtype)
+    rho = pow(m.offset + m.num_updates / chunksize, -m.decay)
+    gammat = m.do_estep(chunk, other)
+    if m.optimize_alpha:
+        m.update_alpha(gammat, rho)
+    m.state.numdocs = num_docs
+    m.do_mstep(rho, other)
+
+def update_group(m, group, num_docs, last):
+    '''LdaMulticore.update on a group of documents of a corpus of num_docs
+    documents, blending into a model of the whole corpus. Perplexity is
+    only evaluated in the last group, as in a pass over the whole corpus.
+    '''
+    eval_every = m.eval_every
+    if not last:
+        m.eval_every = None
+    m.state.numdocs = num_docs - len(group)
+    try:
+        m.update(group)
+    finally:
+        m.eval_every = eval_every
+
+def train_checkpointed(c, run, args):
+    '''Train on groups of args.checkpoint_every chunks, a whole pass by
+    default, saving a checkpoint after each group. With args.resume, start
+    from the last checkpoint of the run. The groups of a resumed run are
+    those of the checkpoint. With one worker the model is updated chunk by
+    chunk as by train, so checkpointed, resumed and plain runs end with the
+    same model.
+    '''
+    out_file = run["out_file"]
+    checkpoint = load_checkpoint(out_file) if args.resume else None
+    if checkpoint:
+        if checkpoint["num_docs"] != len(c) or checkpoint["num_topics"] != run["num_topics"]:
+            raise ValueError("Checkpoint %s is for %d documents and %d topics" % (
+                checkpoint_file(out_file), checkpoint["num_docs"], checkpoint["num_topics"]))
+        model_file = os.path.join(os.path.dirname(out_file), checkpoint["model"])
+        m = (gensim.models.LdaMulticore if args.workers > 1 else gensim.models.LdaModel).load(model_file)
+        docs = checkpoint["docs"]
+        group_docs = checkpoint["group_docs"]
+        print "Resuming at document %d of %d" % (docs, len(c))
+    else:
+        if args.resume:
+            print "No checkpoint, starting from the first document"
+        remove_checkpoint(out_file)
+        m = train(c, run["num_topics"], run["alpha"], run["beta"], args.workers, args.seed, args.chunksize)
+        docs = 0
+        group_docs = args.checkpoint_every * args.chunksize if args.checkpoint_every else len(c)
+    documents = iter(c)
+    # Skip the documents already trained on
+    for document in itertools.islice(documents, docs):
+        pass
+    chunksize = min(len(c), m.chunksize)
+    while docs < len(c):
+        group = list(itertools.islice(documents, group_docs))
+        if args.workers > 1:
+            update_group(m, group, len(c), docs + len(group) == len(c))
+        else:
+            for start in range(0, len(group), chunksize):
+                update_chunk(m, group[start:start + chunksize], (docs + start) / chunksize, len(c))
+        docs += len(group)
+        save_checkpoint(m, out_file, {
+            "docs": docs, "group_docs": group_docs, "num_docs": len(c), "num_topics": run["num_topics"]})
+        logging.info("checkpoint at document %d of %d", docs, len(c))
+    return m
+
+def topic_block(m, start, stop):
+    '''Rows start:stop of the topic-term matrix, normalized as by
+    m.show_topic, which renormalizes each row of m.get_topics().
+    '''
+    eta = m.state.eta
+    if np.ndim(eta) == 2:
+        eta = eta[start:stop]
+    topics = eta + m.state.sstats[start:stop]
+    topics = topics / topics.sum(axis=1)[:, None]
+    return topics / topics.sum(axis=1)[:, None]
+
+def format_probs(probs):
+    '''repr of each float32 probability, formatting each distinct value once.'''
+    values, inverse = np.unique(probs, return_inverse=True)
+    return np.array([repr(value) for value in values], dtype=object)[inverse].tolist()
+
+def top_k_cutoffs(m, num_topics, num_words, top_k, block_entries=2**22):
+    '''The top_k-th largest probability of each node over all topics.'''
+    best = np.zeros((0, num_words), dtype=np.float32)
+    block_topics = max(1, block_entries // max(num_words, 1))
+    for start in range(0, num_topics, block_topics):
+        topics = topic_block(m, start, min(start + block_topics, num_topics))
+        best = np.concatenate((best, topics[:, :num_words]))
+        if len(best) > top_k:
+            best = np.partition(best, len(best) - top_k, axis=0)[-top_k:]
+    return best.min(axis=0)
+
+def select(probs, cutoffs=None, mass=None, min_prob=None):
+    '''Node indexes of one topic's entries that pass every given filter:
+    at least the node's cutoff, among the most probable nodes that make up
+    mass of the topic, at least min_prob.
+    '''
+    keep = np.ones(len(probs), dtype=bool)
+    if cutoffs is not None:
+        keep &= probs >= cutoffs
+    if min_prob is not None:
+        keep &= probs >= min_prob
+    if mass is not None:
+        order = np.argsort(-probs, kind="mergesort")
+        covered = np.cumsum(probs[order], dtype=np.float64)
+        top = np.zeros(len(probs), dtype=bool)
+        top[order[:np.searchsorted(covered, mass) + 1]] = True
+        keep &= top
+    return np.flatnonzero(keep)
+
+def write_topics(m, index_to_id, num_topics, num_words, out_file, block_entries=2**22,
+                 top_k=None, mass=None, min_prob=None, binary_file=None):
+    '''Write node_id,community_id,member_prob for every topic and node to the
+    out_file csv and the binary_file cover, either may be None. The
+    topic-term matrix is read in blocks of about block_entries entries. With
+    top_k, mass or min_prob only the entries selected by select are written,
+    ties at a node's top_k-th probability are kept.
+    '''
+    filtered = top_k is not None or mass is not None or min_prob is not None
+    cutoffs = top_k_cutoffs(m, num_topics, num_words, top_k, block_entries) if top_k is not None else None
+    node_ids = np.asarray(index_to_id[:num_words])
+    node_strs = np.array(map(str, node_ids.tolist()), dtype=object)
+    f_out = open(out_file, "wb") if out_file else None
+    writer = None
+    if binary_file:
+        writer = membership.MembershipWriter(binary_file, {
+            "num_topics": num_topics, "num_nodes": num_words,
+            "top_k": top_k, "mass": mass, "min_prob": min_prob})
+    if f_out:
+        f_out.write("node_id,community_id,member_prob\n")
+    block_topics = max(1, block_entries // max(num_words, 1))
+    for start in range(0, num_topics, block_topics):
+        topics = topic_block(m, start, min(start + block_topics, num_topics))
+        for k in range(len(topics)):
+            topic = start + k
+            probs = topics[k, :num_words]
+            nodes = select(probs, cutoffs, mass, min_prob) if filtered else np.arange(num_words)
+            suffix = ",%d," % topic
+            for a in range(0, len(nodes), block_entries):
+                block = nodes[a:a + block_entries]
+                values = probs[block]
+                if f_out:
+                    f_out.write("".join([node + suffix + prob + "\n"
+                                         for node, prob in zip(node_strs[block].tolist(), format_probs(values))]))
+                if writer:
+                    writer.append(node_ids[block], np.repeat(topic, len(block)), values)
+    if f_out:
+        f_out.close()
+    if writer:
+        writer.close()
+
+def binary_out_file(out_file):
+    '''Binary cover written next to the csv out_file.'''
+    return os.path.splitext(out_file)[0] + ".npy"
+
+modes = {
+    "simple": simple_run,
+    "prior": prior_run,
+    "pertopic": pertopic_run,
+}
+
+def parse_args(argv):
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--workers", type=int, default=1,
+                        help="worker processes, more than 1 trains with LdaMulticore")
+    common.add_argument("--seed", type=int, help="random seed of the model")
+    common.add_argument("--chunksize", type=int, default=2000, help="documents per training chunk")
+    common.add_argument("--checkpoint-every", type=int, metavar="CHUNKS",
+                        help="checkpoint the model every CHUNKS chunks")
+    common.add_argument("--resume", action="store_true", help="continue from the run's last checkpoint")
+    common.add_argument("--top-k", type=int, help="keep each node's k most probable communities")
+    common.add_argument("--mass", type=float,
+                        help="keep the most probable nodes making up this share of each community")
+    common.add_argument("--min-prob", type=float, help="keep memberships of at least this probability")
+    common.add_argument("--format", choices=["csv", "binary", "both"], default="csv",
+                        help="write the csv, a binary cover next to it, or both")
+    parser = argparse.ArgumentParser(description="Run LDA on a network corpus")
+    parser.add_argument("dataset", help="dataset in lda_datasets.py or a json config")
+    subparsers = parser.add_subparsers(dest="mode")
+    simple = subparsers.add_parser("simple", parents=[common], help="LDA with sym or numeric priors")
+    simple.add_argument("num_topics", type=int)
+    simple.add_argument("alpha", nargs="?", default="sym")
+    simple.add_argument("beta", nargs="?", default="sym")
+    prior = subparsers.add_parser("prior", parents=[common], help="LDA with flat community priors")
+    prior.add_argument("base_method")
+    prior.add_argument("double", help="double to add as many communities as the base method")
+    pertopic = subparsers.add_parser("pertopic", parents=[common], help="LDA with per-topic community priors")
+    pertopic.add_argument("base_method")
+    pertopic.add_argument("double", help="double to add as many communities as the base method")
+    pertopic.add_argument("alpha", help="prior, sym or a number")
+    pertopic.add_argument("beta", help="prior, sym or a number")
+    pertopic.set_defaults(suffix="")
+    sweep = subparsers.add_parser("sweep", parents=[common], help="pertopic runs over a grid of priors")
+    sweep.add_argument("base_method")
+    sweep.add_argument("--alphas", default="sym,prior", help="comma separated alphas")
+    sweep.add_argument("--betas", default="sym,prior", help="comma separated betas")
+    sweep.add_argument("--doubles", default="single,double", help="comma separated single and/or double")
+    sweep.add_argument("--processes", type=int, default=multiprocessing.cpu_count())
+    sweep.add_argument("--memory-mb", type=float, help="memory budget of the runs at a time, unbounded by default")
+    return parser.parse_args(argv)
+
+def execute(config, args):
+    '''Train and write the communities for one run.'''
+    run = modes[args.mode](config, args)
+
+    logging.basicConfig(filename=run["log_file"], format=log_format, level=run["log_level"])
+    corpus = shared["corpus"] if "corpus" in shared else load_corpus(config)
+    c = PrefetchCorpus.PrefetchCorpus(corpus, chunksize=args.chunksize)
+    if run["num_words"] is not None:
+        c.check_num_terms(run["num_words"])
+    if args.checkpoint_every or args.resume:
+        m = train_checkpointed(c, run, args)
+    else:
+        m = train(c, run["num_topics"], run["alpha"], run["beta"], args.workers, args.seed, args.chunksize,
+                  corpus=c)
+    num_words = m.num_terms
+
+    # Load dictionary
+    print "Loading dictionary"
+    if "index_to_id" in shared:
+        index_to_id = shared["index_to_id"]
+    else:
+        index_to_id = nodedict.load(config["dict_file"]).ids
+
+    print "Writing output"
+    out_file = run["out_file"] if args.format != "binary" else None
+    run["binary_file"] = binary_out_file(run["out_file"]) if args.format != "csv" else None
+    write_topics(m, index_to_id, run["num_topics"], num_words, out_file,
+                 top_k=args.top_k, mass=args.mass, min_prob=args.min_prob, binary_file=run["binary_file"])
+    remove_checkpoint(run["out_file"])
+    return run
+
+def sweep_runs(args, num_topics, num_words):
+    '''(megabytes, args) of the pertopic runs in the grid of args. When the
+    grid has single and double runs of the same priors, which would write
+    the same files, the double runs get a -double suffix.
+    '''
+    alphas, betas, doubles = [value.split(",") for value in [args.alphas, args.betas, args.doubles]]
+    suffix = "-double" if len(set(doubles)) > 1 else ""
+    runs = []
+    for double in doubles:
+        for alpha in alphas:
+            for beta in betas:
+                run_args = copy.copy(args)
+                run_args.mode = "pertopic"
+                run_args.double = double
+                run_args.alpha = alpha
+                run_args.beta = beta
+                run_args.suffix = suffix if double == "double" else ""
+                k = num_topics * 2 if double == "double" else num_topics
+                megabytes = model_entry_bytes * k * num_words * max(1, args.workers) / 2.0**20
+                runs.append((megabytes, run_args))
+    return runs
+
+def schedule(config, runs, processes, memory_mb):
+    '''Run each (megabytes, args) run in a forked process, largest first, with
+    at most processes runs at a time whose megabytes fit in memory_mb. A run
+    larger than memory_mb runs alone. Returns the args of failed runs, their
+    tracebacks are printed by multiprocessing.
+    '''
+    pending = sorted(runs, key=lambda run: run[0], reverse=True)
+    running = []
+    failed = []
+    while pending or running:
+        used = sum([megabytes for megabytes, p, run_args in running])
+        started = False
+        for megabytes, run_args in list(pending):
+            if len(running) >= processes:
+                break
+            if running and used + megabytes > memory_mb:
+                continue
+            p = multiprocessing.Process(target=execute, args=(config, run_args))
+            p.start()
+            print "Started %s %s-%s (%.0f MB)" % (run_args.double, run_args.alpha, run_args.beta, megabytes)
+            running.append((megabytes, p, run_args))
+            pending.remove((megabytes, run_args))
+            used += megabytes
+            started = True
+        finished = [run for run in running if not run[1].is_alive()]
+        if not finished and not started:
+            time.sleep(0.1)
+        for run in finished:
+            megabytes, p, run_args = run
+            p.join()
+            running.remove(run)
+            if p.exitcode != 0:
+                failed.append(run_args)
+            print "Finished %s %s-%s: exit code %d" % (run_args.double, run_args.alpha, run_args.beta, p.exitcode)
+    return failed
+
+def sweep(config, args):
+    '''Run the pertopic grid of args in a process pool bounded by memory.'''
+    shared["beta"] = communityprior_pertopic.load_beta(pertopic_beta_file(config, args.base_method))
+    shared["corpus"] = load_corpus(config)
+    shared["index_to_id"] = nodedict.load(config["dict_file"]).ids
+    num_topics, num_words = shared["beta"].shape
+    runs = sweep_runs(args, num_topics, num_words)
+    if args.memory_mb is None:
+        args.memory_mb = sum([megabytes for megabytes, run_args in runs])
+    print "%d runs on %d processes within %d MB" % (len(runs), args.processes, args.memory_mb)
+    try:
+        failed = schedule(config, runs, args.processes, args.memory_mb)
+    finally:
+        shared.clear()
+    if failed:
+        print "%d of %d runs failed" % (len(failed), len(runs))
+    return failed
+
+def main(argv):
+    args = parse_args(argv)
+    config = load_config(args.dataset)
+    if args.mode == "sweep":
+        return sweep(config, args)
+    return execute(config, args)
+
+if __name__ == '__main__':
+    result = main(sys.argv[1:])
+    # Failed sweep runs, other modes return their run
+    if parse_args(sys.argv[1:]).mode == "sweep" and result:
+        sys.exit(1)
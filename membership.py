@@ -0,0 +1,99 @@
+import json
+import os
+import shutil
+import sys
+import numpy as np
+import pandas as pd
+
+columns = ["node_id", "community_id", "member_prob"]
+
+# Compact column types used when streaming large covers
+compact_dtypes = {
+    "node_id": np.int32,
+    "community_id": np.int32,
+    "member_prob": np.float32,
+}
+
+# Binary covers are .npy files of these records, with a json header
+# <prefix>.json giving the number of rows and how the rows were selected.
+binary_dtype = np.dtype([(name, compact_dtypes[name]) for name in columns])
+
+def header_file(filename):
+    return os.path.splitext(filename)[0] + ".json"
+
+def is_binary(filename):
+    with open(filename, "rb") as f:
+        return f.read(6) == np.lib.format.MAGIC_PREFIX
+
+class MembershipWriter(object):
+    '''Write a binary cover a block of rows at a time. Rows are appended to
+    a raw file, which becomes the .npy file on close.
+    '''
+    def __init__(self, filename, header=None):
+        self.filename = filename
+        self.header = dict(header or {})
+        self.f = open(filename + ".raw", "wb")
+        self.num_rows = 0
+
+    def append(self, node_ids, community_ids, member_probs):
+        node_ids = np.asarray(node_ids)
+        if len(node_ids) > 0 and node_ids.max() > np.iinfo(np.int32).max:
+            raise ValueError("Node id %d does not fit in int32" % node_ids.max())
+        rows = np.empty(len(node_ids), dtype=binary_dtype)
+        rows["node_id"] = node_ids
+        rows["community_id"] = community_ids
+        rows["member_prob"] = member_probs
+        self.f.write(rows.tobytes())
+        self.num_rows += len(rows)
+
+    def close(self):
+        self.f.close()
+        with open(self.filename + ".tmp", "wb") as f:
+            np.lib.format.write_array_header_1_0(f, {
+                "descr": np.lib.format.dtype_to_descr(binary_dtype),
+                "fortran_order": False,
+                "shape": (self.num_rows,),
+            })
+            with open(self.filename + ".raw", "rb") as f_raw:
+                shutil.copyfileobj(f_raw, f)
+        os.rename(self.filename + ".tmp", self.filename)
+        os.remove(self.filename + ".raw")
+        self.header["num_rows"] = self.num_rows
+        with open(header_file(self.filename), "wb") as f:
+            json.dump(self.header, f, indent=1, sort_keys=True)
+
+def csv_to_binary(com_file, filename, chunk_rows=2**20):
+    '''Convert a membership csv to a binary cover.'''
+    writer = MembershipWriter(filename, {"source": os.path.basename(com_file)})
+    for chunk in read_memberships(com_file, chunk_rows):
+        writer.append(chunk["node_id"].values, chunk["community_id"].values, chunk["member_prob"].values)
+    writer.close()
+    return writer.num_rows
+
+def load_binary(filename):
+    '''Memory-map the rows of a binary cover.'''
+    return np.load(filename, mmap_mode="r")
+
+def binary_chunks(rows, chunk_rows, dtype):
+    for start in range(0, len(rows), chunk_rows):
+        yield pd.DataFrame(rows[start:start + chunk_rows]).astype(dtype or compact_dtypes)
+
+def read_memberships(filename, chunk_rows=None, dtype=None):
+    '''Read a node_id,community_id,member_prob csv or binary cover.
+    With chunk_rows, return an iterator over DataFrames of at most chunk_rows
+    rows, read with the compact column types unless dtype is given.
+    Binary covers keep the compact column types unless dtype is given.
+    '''
+    if is_binary(filename):
+        rows = load_binary(filename)
+        if chunk_rows:
+            return binary_chunks(rows, chunk_rows, dtype)
+        return pd.DataFrame(rows).astype(dtype or compact_dtypes)
+    if chunk_rows and dtype is None:
+        dtype = compact_dtypes
+    return pd.read_csv(filename, usecols=columns, dtype=dtype, chunksize=chunk_rows)
+
+if __name__ == '__main__':
+    # python membership.py output/communities/flickr-louvain.csv output/communities/flickr-louvain.npy
+    num_rows = csv_to_binary(sys.argv[1], sys.argv[2])
+    print "Wrote %d rows" % num_rows
@@ -0,0 +1,108 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+
+class NodeDict(object):
+    '''Mapping between node ids and node indexes backed by numpy arrays.
+
+    ids[i] is the id of the node with index i. Lookups by id search a sorted
+    view of the ids, which is ids itself when the dictionary is in id order.
+    '''
+    def __init__(self, ids):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        if (np.diff(self.ids) > 0).all():
+            self.order = None
+            self.sorted_ids = self.ids
+        else:
+            self.order = np.argsort(self.ids, kind='mergesort')
+            self.sorted_ids = self.ids[self.order]
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, node_id):
+        index = self.index(np.array([node_id]))[0]
+        if index < 0:
+            raise KeyError(node_id)
+        return int(index)
+
+    def __contains__(self, node_id):
+        return self.index(np.array([node_id]))[0] >= 0
+
+    def index(self, ids):
+        '''Map an array of node ids to node indexes, or -1 for unknown ids.'''
+        ids = np.asarray(ids, dtype=np.int64)
+        if len(self.sorted_ids) == 0:
+            return np.full(ids.shape, -1, dtype=np.int64)
+        pos = np.searchsorted(self.sorted_ids, ids)
+        pos[pos == len(self.sorted_ids)] = 0
+        found = self.sorted_ids[pos] == ids
+        if self.order is not None:
+            pos = self.order[pos]
+        return np.where(found, pos, -1)
+
+    def id(self, indexes):
+        '''Map an array of node indexes to node ids.'''
+        return self.ids[indexes]
+
+def from_mapping(id_to_index):
+    '''Build a NodeDict from a {node_id: node_index} dict.'''
+    ids = np.zeros(len(id_to_index), dtype=np.int64)
+    ids[np.fromiter(id_to_index.itervalues(), dtype=np.int64, count=len(id_to_index))] = np.fromiter(
+        id_to_index.iterkeys(), dtype=np.int64, count=len(id_to_index))
+    return NodeDict(ids)
+
+def cache_file(dict_file):
+    return dict_file + ".npy"
+
+def cache_header_file(dict_file):
+    return dict_file + ".json"
+
+def csv_stat(dict_file):
+    '''Size and mtime of the csv, recorded with the cache it was read into.'''
+    st = os.stat(dict_file)
+    return {"size": st.st_size, "mtime": repr(st.st_mtime)}
+
+def read_csv(dict_file):
+    '''Parse a node_index,node_id csv into an array of ids by index.'''
+    df = pd.read_csv(dict_file, dtype=np.int64)
+    ids = np.zeros(len(df), dtype=np.int64)
+    ids[df['node_index'].values] = df['node_id'].values
+    return ids
+
+def load(dict_file):
+    '''Load a node_index,node_id csv as a NodeDict.
+    The ids are cached in a .npy file next to the csv, with the size and
+    mtime of the csv they were read from in a json header. The cache is
+    used while both still match the csv.
+    '''
+    cache = cache_file(dict_file)
+    if os.path.exists(cache) and os.path.exists(cache_header_file(dict_file)):
+        with open(cache_header_file(dict_file), "rb") as f:
+            header = json.load(f)
+        num_ids = header.pop("num_ids")
+        if header == csv_stat(dict_file):
+            ids = np.load(cache)
+            if len(ids) == num_ids:
+                return NodeDict(ids)
+    ids = read_csv(dict_file)
+    save_cache(dict_file, ids)
+    return NodeDict(ids)
+
+def save_cache(dict_file, ids):
+    '''Write the cache of ids for dict_file, e.g. after writing or
+    appending to it.
+    '''
+    cache = cache_file(dict_file)
+    header = dict(csv_stat(dict_file), num_ids=len(ids))
+    try:
+        # Write then rename, so a partial cache is never used
+        with open(cache + ".tmp", "wb") as f:
+            np.save(f, np.asarray(ids, dtype=np.int64))
+        with open(cache_header_file(dict_file) + ".tmp", "wb") as f:
+            json.dump(header, f, indent=1, sort_keys=True)
+        os.rename(cache + ".tmp", cache)
+        os.rename(cache_header_file(dict_file) + ".tmp", cache_header_file(dict_file))
+    except (IOError, OSError):
+        pass
@@ -0,0 +1,309 @@
+import os
+import numpy as np
+import pandas as pd
+
+import communityprior
+
+# Sufficient statistics of the simple flat prior estimate, kept in a
+# directory of .npy files so a delta of membership rows can be applied
+# without re-reading the full cover:
+#   node_comcount, beta_acc            indexed by node index
+#   com_ids, com_nodecount, com_rows,
+#   alpha_acc                          indexed by position in sorted com_ids,
+#                                      com_rows counts the member nodes
+#   base_*                             the cover grouped by node and community
+#   delta_*                            rows applied since the base, removals
+#                                      have negative member_prob
+#   journal.npz                        changes of an update being saved
+# An update is saved by writing its changes to the journal, which is
+# replaced atomically, and then copying them into the .npy files. load()
+# completes a save that was interrupted, so a delta is applied once or not
+# at all.
+accumulators = ["node_comcount", "beta_acc", "com_ids", "com_nodecount", "com_rows", "alpha_acc"]
+base = ["base_com_ids", "node_indptr", "node_com", "node_prob", "com_indptr", "com_node", "com_prob"]
+deltas = ["delta_node", "delta_com", "delta_prob"]
+
+# Delta rows are folded into the base once there are more than this share
+# of the base rows, and at least min_fold_rows
+fold_share = 0.25
+min_fold_rows = 2**16
+
+# Memberships up to this are taken as removed
+tolerance = 1e-9
+
+def group(keys, num_keys, values):
+    '''Sort values by key, return (indptr, sorted values).'''
+    order = np.argsort(keys, kind='mergesort')
+    indptr = np.concatenate(([0], np.cumsum(np.bincount(keys, minlength=num_keys))))
+    return (indptr, [v[order] for v in values])
+
+def ranges(indptr, keys):
+    '''Positions of all entries belonging to keys in a grouped array.'''
+    starts = indptr[keys]
+    lengths = indptr[keys + 1] - starts
+    offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+    return offsets + np.arange(lengths.sum())
+
+def compute(node_index, com_id, mem_p, num_nodes):
+    '''Compute statistics for a full cover given as index arrays.'''
+    com_ids, com_index = np.unique(com_id, return_inverse=True)
+    num_coms = len(com_ids)
+    stats = {}
+    stats["node_comcount"] = np.bincount(node_index, weights=mem_p, minlength=num_nodes)
+    stats["com_ids"] = com_ids
+    stats["com_nodecount"] = np.bincount(com_index, weights=mem_p, minlength=num_coms)
+    pairs = np.unique(node_index * np.int64(num_coms) + com_index)
+    stats["com_rows"] = np.bincount(pairs % num_coms, minlength=num_coms)
+    stats["alpha_acc"] = np.bincount(
+        com_index, weights=mem_p / stats["node_comcount"][node_index], minlength=num_coms)
+    stats["beta_acc"] = np.bincount(
+        node_index, weights=mem_p / stats["com_nodecount"][com_index], minlength=num_nodes)
+    stats["base_com_ids"] = com_ids
+    stats["node_indptr"], (stats["node_com"], stats["node_prob"]) = group(
+        node_index, num_nodes, [com_id, mem_p])
+    stats["com_indptr"], (stats["com_node"], stats["com_prob"]) = group(
+        com_index, num_coms, [node_index, mem_p])
+    stats["delta_node"] = np.zeros(0, dtype=np.int64)
+    stats["delta_com"] = np.zeros(0, dtype=np.int64)
+    stats["delta_prob"] = np.zeros(0)
+    return stats
+
+def save(stats_dir, stats, names=None):
+    '''Write statistics, each file is replaced atomically but not the set of
+    files. Use save_update to save the changes of apply_delta.
+    '''
+    if not os.path.isdir(stats_dir):
+        os.makedirs(stats_dir)
+    for name in names or accumulators + base + deltas:
+        write_array(stats_dir, name, stats[name])
+
+def write_array(stats_dir, name, values):
+    path = os.path.join(stats_dir, name + ".npy")
+    with open(path + ".tmp", "wb") as f:
+        np.save(f, values)
+    os.rename(path + ".tmp", path)
+
+def journal_file(stats_dir):
+    return os.path.join(stats_dir, "journal.npz")
+
+def replay(stats_dir):
+    '''Copy the changes in the journal into the statistics files, then
+    remove the journal. Copying twice gives the same files.
+    '''
+    path = journal_file(stats_dir)
+    if not os.path.exists(path):
+        return
+    journal = np.load(path)
+    for name in accumulators + base + deltas:
+        if name in journal.files:
+            write_array(stats_dir, name, journal[name])
+        elif name + "-index" in journal.files:
+            values = np.load(os.path.join(stats_dir, name + ".npy"), mmap_mode="r+")
+            values[journal[name + "-index"]] = journal[name + "-value"]
+            values.flush()
+            del values
+    journal.close()
+    os.remove(path)
+
+def save_update(stats_dir, stats):
+    '''Save the statistics changed by apply_delta through the journal.
+    Accumulators loaded with update=True have only their touched entries
+    written, arrays apply_delta replaced are written in full.
+    '''
+    touched = stats.pop("touched", {})
+    journal = {}
+    for name in accumulators + base:
+        path = os.path.join(stats_dir, name + ".npy")
+        if isinstance(stats[name], np.memmap) and stats[name].filename == os.path.abspath(path):
+            if name in touched:
+                index = np.unique(np.concatenate(touched[name]))
+                journal[name + "-index"] = index
+                journal[name + "-value"] = stats[name][index]
+        else:
+            # Grown accumulators and a folded base
+            journal[name] = stats[name]
+    for name in deltas:
+        journal[name] = stats[name]
+    path = journal_file(stats_dir)
+    with open(path + ".tmp", "wb") as f:
+        np.savez(f, **journal)
+    os.rename(path + ".tmp", path)
+    replay(stats_dir)
+
+def load(stats_dir, update=False):
+    '''Load statistics, the base cover is memory-mapped. With update, the
+    accumulators are memory-mapped copy-on-write: apply_delta changes them
+    in memory only, and save_update writes the touched entries.
+    '''
+    replay(stats_dir)
+    stats = {}
+    for name in accumulators:
+        stats[name] = np.load(os.path.join(stats_dir, name + ".npy"), mmap_mode="c" if update else None)
+    for name in deltas:
+        stats[name] = np.load(os.path.join(stats_dir, name + ".npy"))
+    for name in base:
+        stats[name] = np.load(os.path.join(stats_dir, name + ".npy"), mmap_mode="r")
+    return stats
+
+def save_cover(stats_dir, com_data, id_to_index):
+    '''Compute and save statistics for a full cover.'''
+    node_index, com_id, mem_p = communityprior.index_chunk(com_data, communityprior.as_node_dict(id_to_index))
+    stats = compute(node_index, com_id, mem_p, len(id_to_index))
+    save(stats_dir, stats)
+    return stats
+
+def rows_for_nodes(stats, nodes):
+    '''All current rows (node, com_id, prob) of the given node indexes.'''
+    base_nodes = nodes[nodes < len(stats["node_indptr"]) - 1]
+    pos = ranges(stats["node_indptr"], base_nodes)
+    base_node = np.repeat(base_nodes, np.diff(stats["node_indptr"])[base_nodes])
+    in_delta = np.in1d(stats["delta_node"], nodes)
+    return (
+        np.concatenate((base_node, stats["delta_node"][in_delta])),
+        np.concatenate((stats["node_com"][pos], stats["delta_com"][in_delta])),
+        np.concatenate((stats["node_prob"][pos], stats["delta_prob"][in_delta])))
+
+def rows_for_coms(stats, com_ids):
+    '''All current rows (node, com_id, prob) of the given community ids.'''
+    base_ids = stats["base_com_ids"]
+    base_pos = np.searchsorted(base_ids, com_ids)
+    base_pos[base_pos == len(base_ids)] = 0
+    coms = base_pos[base_ids[base_pos] == com_ids] if len(base_ids) > 0 else base_pos[:0]
+    pos = ranges(stats["com_indptr"], coms)
+    base_com = np.repeat(base_ids[coms], np.diff(stats["com_indptr"])[coms])
+    in_delta = np.in1d(stats["delta_com"], com_ids)
+    return (
+        np.concatenate((stats["com_node"][pos], stats["delta_node"][in_delta])),
+        np.concatenate((base_com, stats["delta_com"][in_delta])),
+        np.concatenate((stats["com_prob"][pos], stats["delta_prob"][in_delta])))
+
+def add_at(stats, name, indexes, values):
+    '''np.add.at on an accumulator, recording the indexes for save_update.'''
+    np.add.at(stats[name], indexes, values)
+    stats.setdefault("touched", {}).setdefault(name, []).append(np.asarray(indexes, dtype=np.int64))
+
+def safe_divide(p, total):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(total > 0, p / total, 0.0)
+
+def pair_totals(a_node, a_com, a_prob, d_node, d_com, d_prob):
+    '''Membership of each (node, community) pair of the delta before and
+    after it, given the current rows a_* of the delta's nodes.
+    Raises ValueError if a pair would end below zero.
+    '''
+    keys = pd.MultiIndex.from_arrays([d_node, d_com]).unique()
+    before = pd.Series(a_prob).groupby([a_node, a_com]).sum().reindex(keys, fill_value=0.0).values
+    after = before + pd.Series(d_prob).groupby([d_node, d_com]).sum().reindex(keys).values
+    bad = after < -tolerance
+    if bad.any():
+        raise ValueError("Removal of node index %d from community %d does not match the cover" % (
+            keys.get_level_values(0)[bad][0], keys.get_level_values(1)[bad][0]))
+    return (keys.get_level_values(1).values, before, after)
+
+def fold(stats):
+    '''Merge the delta rows into the base cover, as one row for each
+    (node, community) pair with a membership left.
+    '''
+    node_indptr = stats["node_indptr"]
+    base_node = np.repeat(np.arange(len(node_indptr) - 1), np.diff(node_indptr))
+    rows = pd.DataFrame({
+        "node": np.concatenate((base_node, stats["delta_node"])),
+        "com": np.concatenate((stats["node_com"], stats["delta_com"])),
+        "prob": np.concatenate((stats["node_prob"], stats["delta_prob"]))})
+    totals = rows.groupby(["node", "com"])["prob"].sum()
+    totals = totals[totals > tolerance]
+    node_index = totals.index.get_level_values(0).values.astype(np.int64)
+    com_id = totals.index.get_level_values(1).values.astype(np.int64)
+    mem_p = totals.values
+    com_ids, com_index = np.unique(com_id, return_inverse=True)
+    stats["base_com_ids"] = com_ids
+    stats["node_indptr"], (stats["node_com"], stats["node_prob"]) = group(
+        node_index, len(stats["node_comcount"]), [com_id, mem_p])
+    stats["com_indptr"], (stats["com_node"], stats["com_prob"]) = group(
+        com_index, len(com_ids), [node_index, mem_p])
+    stats["delta_node"] = np.zeros(0, dtype=np.int64)
+    stats["delta_com"] = np.zeros(0, dtype=np.int64)
+    stats["delta_prob"] = np.zeros(0)
+
+def apply_delta(stats, d_node, d_com, d_prob, num_nodes, fold_rows=None):
+    '''Update statistics in place for delta rows, with removals given as
+    negative member_prob. Work is proportional to the rows of the nodes and
+    communities touched by the delta, except when nodes or communities are
+    added or the delta rows are folded into the base, once there are more
+    than fold_rows of them. Raises ValueError, before changing anything, for
+    removals of more than a node's membership in a community.
+    '''
+    nodes = np.unique(d_node)
+    a_node, a_com, a_prob = rows_for_nodes(stats, nodes)
+    p_com, p_before, p_after = pair_totals(a_node, a_com, a_prob, d_node, d_com, d_prob)
+
+    # Grow node arrays for nodes appended to the dictionary
+    grow = num_nodes - len(stats["node_comcount"])
+    if grow > 0:
+        stats["node_comcount"] = np.concatenate((stats["node_comcount"], np.zeros(grow)))
+        stats["beta_acc"] = np.concatenate((stats["beta_acc"], np.zeros(grow)))
+
+    # Add new communities in sorted position
+    com_ids = stats["com_ids"]
+    pos = np.searchsorted(com_ids, d_com)
+    known = pos < len(com_ids)
+    known[known] = com_ids[pos[known]] == d_com[known]
+    new_ids = np.unique(d_com[~known])
+    if len(new_ids) > 0:
+        com_ids = np.union1d(com_ids, new_ids)
+        old_pos = np.searchsorted(com_ids, stats["com_ids"])
+        for name in ["com_nodecount", "com_rows", "alpha_acc"]:
+            values = np.zeros(len(com_ids), dtype=stats[name].dtype)
+            values[old_pos] = stats[name]
+            stats[name] = values
+        stats["com_ids"] = com_ids
+
+    # Remove the old contributions of every row of a touched node or community
+    coms = np.unique(d_com)
+    b_node, b_com, b_prob = rows_for_coms(stats, coms)
+    a_pos = np.searchsorted(com_ids, a_com)
+    b_pos = np.searchsorted(com_ids, b_com)
+    add_at(stats, "alpha_acc", a_pos, -safe_divide(a_prob, stats["node_comcount"][a_node]))
+    add_at(stats, "beta_acc", b_node, -safe_divide(b_prob, stats["com_nodecount"][b_pos]))
+
+    # Update totals and record the delta rows
+    d_pos = np.searchsorted(com_ids, d_com)
+    add_at(stats, "node_comcount", d_node, d_prob)
+    add_at(stats, "com_nodecount", d_pos, d_prob)
+    # A node joins or leaves a community when its membership starts or ends
+    add_at(stats, "com_rows", np.searchsorted(com_ids, p_com),
+           (p_after > tolerance).astype(np.int64) - (p_before > tolerance))
+    stats["delta_node"] = np.concatenate((stats["delta_node"], d_node))
+    stats["delta_com"] = np.concatenate((stats["delta_com"], d_com))
+    stats["delta_prob"] = np.concatenate((stats["delta_prob"], d_prob))
+
+    # Add the new contributions, a removed row cancels its original
+    a_node, a_com, a_prob = [np.concatenate(x) for x in zip((a_node, a_com, a_prob), (d_node, d_com, d_prob))]
+    b_node, b_com, b_prob = [np.concatenate(x) for x in zip((b_node, b_com, b_prob), (d_node, d_com, d_prob))]
+    a_pos = np.searchsorted(com_ids, a_com)
+    b_pos = np.searchsorted(com_ids, b_com)
+    add_at(stats, "alpha_acc", a_pos, safe_divide(a_prob, stats["node_comcount"][a_node]))
+    add_at(stats, "beta_acc", b_node, safe_divide(b_prob, stats["com_nodecount"][b_pos]))
+
+    if fold_rows is None:
+        fold_rows = max(min_fold_rows, int(fold_share * len(stats["node_prob"])))
+    if len(stats["delta_node"]) > fold_rows:
+        fold(stats)
+    return stats
+
+def read_delta(delta_file, id_to_index):
+    '''Read delta rows from a node_id,community_id,member_prob csv with an
+    optional action column, where "remove" marks a row to remove.
+    '''
+    df = pd.read_csv(delta_file)
+    node_index, com_id, mem_p = communityprior.index_chunk(df, communityprior.as_node_dict(id_to_index))
+    if "action" in df.columns:
+        mem_p = np.where(df["action"].values == "remove", -mem_p, mem_p)
+    return (node_index, com_id, mem_p)
+
+def estimate(stats):
+    '''Flat (alpha, beta) from statistics, as estimate_simple would give.'''
+    live = stats["com_rows"] > 0
+    num_nodes = len(stats["node_comcount"])
+    return communityprior.smooth_simple(
+        stats["alpha_acc"][live], stats["beta_acc"].copy(), num_nodes, int(live.sum()))
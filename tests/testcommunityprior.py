@@ -0,0 +1,310 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import numpy.testing as nptest
+import pandas as pd
+import scipy.sparse as spsparse
+import batch_priors
+import communityprior
+import communityprior_pertopic
+import dirichletmle
+import membership
+import priorstats
+
+# Reference output of the original row-by-row estimator on examples/example.csv
+
+example_file = os.path.join(os.path.dirname(__file__), "..", "examples", "example.csv")
+df_example = pd.read_csv(example_file)
+
+example_id_to_index = dict([(i, i) for i in range(4)])
+
+true_alpha = np.array([
+    0.39158585383914335,
+    0.3290447354180907,
+    0.27936941074276606
+])
+
+true_beta = np.array([
+    0.5554848966613672,
+    0.6945151033386328,
+    0.5798092209856915,
+    0.6701907790143085
+])
+
+true_beta_pertopic = np.array([
+    [5.309309309309309111e-01, 3.687687687687687399e-01, 3.687687687687687399e-01, 1.093093093093092938e-01],
+    [1.093093093093092938e-01, 3.687687687687687399e-01, 3.687687687687687399e-01, 5.309309309309309111e-01],
+    [1.150326797385620853e-01, 5.738562091503267570e-01, 1.150326797385620853e-01, 5.738562091503267570e-01]
+])
+
+class TestMatrix(unittest.TestCase):
+
+    def test_sparse(self):
+        node_com = communityprior.data_to_matrix(df_example)
+        self.assertTrue(spsparse.issparse(node_com))
+        nptest.assert_array_equal(node_com.toarray(), communityprior.data_to_matrix(df_example, dense=True))
+
+    def test_load(self):
+        nptest.assert_array_equal(communityprior.load_as_matrix(example_file, dense=True),
+                                  communityprior.data_to_matrix(df_example, dense=True))
+
+    def test_normalize_rows(self):
+        node_com = communityprior.data_to_matrix(df_example)
+        dense = node_com.toarray()
+        nptest.assert_array_almost_equal(
+            communityprior.normalize_rows(node_com).toarray(),
+            communityprior.normalize_rows(dense))
+        nptest.assert_array_almost_equal(
+            communityprior.normalize_rows(node_com.transpose()).toarray(),
+            communityprior.normalize_rows(dense.transpose()))
+
+class TestSimple(unittest.TestCase):
+
+    def test_example(self):
+        alpha, beta = communityprior.estimate_simple(df_example, example_id_to_index)
+        nptest.assert_array_equal(alpha, true_alpha)
+        nptest.assert_array_equal(beta, true_beta)
+
+    def test_stream(self):
+        alpha, beta = communityprior.estimate_simple_stream(example_file, example_id_to_index, 5)
+        # Streaming reads member_prob as float32
+        nptest.assert_allclose(alpha, true_alpha, rtol=1e-7)
+        nptest.assert_allclose(beta, true_beta, rtol=1e-7)
+
+    def test_binary_cover(self):
+        out_dir = tempfile.mkdtemp()
+        try:
+            cover_file = os.path.join(out_dir, "example.npy")
+            self.assertEqual(membership.csv_to_binary(example_file, cover_file, chunk_rows=5), len(df_example))
+            df = membership.read_memberships(cover_file)
+            nptest.assert_array_equal(df["node_id"], df_example["node_id"])
+            alpha, beta = communityprior.estimate_simple(df, example_id_to_index)
+            nptest.assert_allclose(alpha, true_alpha, rtol=1e-7)
+            alpha, beta = communityprior.estimate_simple_stream(cover_file, example_id_to_index, 5)
+            nptest.assert_allclose(beta, true_beta, rtol=1e-7)
+        finally:
+            shutil.rmtree(out_dir)
+
+    def test_unknown_node(self):
+        df = df_example.copy()
+        df.loc[0, "node_id"] = 99
+        self.assertRaises(KeyError, communityprior.estimate_simple, df, example_id_to_index)
+
+class TestPerTopic(unittest.TestCase):
+
+    def test_example(self):
+        alpha, beta = communityprior_pertopic.estimate_simple(df_example, example_id_to_index)
+        nptest.assert_array_equal(alpha, true_alpha)
+        self.assertEqual(beta.shape, (3, 4))
+        nptest.assert_array_almost_equal(beta.toarray(), true_beta_pertopic, decimal=15)
+
+    def test_stream(self):
+        alpha, beta = communityprior_pertopic.estimate_simple_stream(example_file, example_id_to_index, 5)
+        nptest.assert_allclose(alpha, true_alpha, rtol=1e-7)
+        nptest.assert_allclose(beta.toarray(), true_beta_pertopic, rtol=1e-7)
+
+    def test_blocks(self):
+        alpha, beta = communityprior_pertopic.estimate_simple(df_example, example_id_to_index)
+        blocks = [block for start, block in beta.iter_blocks(max_entries=4)]
+        self.assertEqual(len(blocks), 3)
+        nptest.assert_array_equal(np.concatenate(blocks), beta.toarray())
+
+    def test_binary(self):
+        alpha, beta = communityprior_pertopic.estimate_simple(df_example, example_id_to_index)
+        out_dir = tempfile.mkdtemp()
+        try:
+            beta_file = os.path.join(out_dir, "beta.npy")
+            communityprior_pertopic.write_beta_binary(beta_file, beta)
+            loaded = communityprior_pertopic.load_beta(beta_file)
+            self.assertTrue(isinstance(loaded, np.memmap))
+            nptest.assert_array_almost_equal(loaded, true_beta_pertopic, decimal=6)
+            text_file = os.path.join(out_dir, "beta.csv")
+            communityprior_pertopic.write_beta_text(text_file, beta)
+            nptest.assert_array_almost_equal(communityprior_pertopic.load_beta(text_file), true_beta_pertopic)
+            del loaded
+        finally:
+            shutil.rmtree(out_dir)
+
+    def test_missing_zero(self):
+        # Node 0 may be missing from the dictionary, other nodes may not
+        id_to_index = dict([(i, i - 1) for i in range(1, 4)])
+        alpha, beta = communityprior_pertopic.estimate_simple(df_example, id_to_index)
+        self.assertEqual(beta.shape, (3, 3))
+        df = df_example.copy()
+        df.loc[1, "node_id"] = 99
+        self.assertRaises(KeyError, communityprior_pertopic.estimate_simple, df, id_to_index)
+
+    def test_stream_missing_zero(self):
+        # Node 0 is skipped, but its community is kept
+        id_to_index = dict([(i, i - 1) for i in range(1, 4)])
+        out_dir = tempfile.mkdtemp()
+        try:
+            com_file = os.path.join(out_dir, "cover.csv")
+            with open(com_file, "wb") as f:
+                f.write("node_id,community_id,member_prob\n0,5,1\n1,2,1\n2,2,0.5\n3,2,1\n")
+            df = pd.read_csv(com_file)
+            true_alpha, true_beta = communityprior_pertopic.estimate_simple(df, id_to_index)
+            nptest.assert_array_almost_equal(true_alpha, [0.95, 0.05])
+            alpha, beta = communityprior_pertopic.estimate_simple_stream(com_file, id_to_index, 2)
+            nptest.assert_array_almost_equal(alpha, true_alpha)
+            nptest.assert_array_almost_equal(beta.toarray(), true_beta.toarray())
+        finally:
+            shutil.rmtree(out_dir)
+
+class TestBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def read_column(self, filename):
+        return pd.read_csv(filename, float_precision="round_trip").iloc[:,0].values
+
+    def test_two_covers(self):
+        dict_file = os.path.join(os.path.dirname(example_file), "example-dict.csv")
+        other_file = os.path.join(self.dir, "other.csv")
+        other = df_example.copy()
+        other["member_prob"] = other["member_prob"][::-1].values
+        other.to_csv(other_file, index=False)
+        covers = [("louvain", df_example, example_file), ("other", other, other_file)]
+        for chunk_rows in [[], ["--chunk-rows", "5"]]:
+            prefix = os.path.join(self.dir, "out", "example")
+            methods = batch_priors.main([dict_file, prefix, "louvain=" + example_file, other_file,
+                                         "--processes", "2"] + chunk_rows)
+            self.assertEqual(sorted(methods), ["louvain", "other"])
+            id_to_index = communityprior.get_id_to_index(dict_file)
+            for method, df, cover_file in covers:
+                method_prefix = "%s-%s" % (prefix, method)
+                alpha, beta = communityprior.estimate_simple(df, id_to_index)
+                nptest.assert_allclose(self.read_column(method_prefix + "-alpha.csv"), alpha, rtol=1e-7)
+                nptest.assert_allclose(self.read_column(method_prefix + "-beta.csv"), beta, rtol=1e-7)
+                alpha, beta = communityprior_pertopic.estimate_simple(df, id_to_index)
+                nptest.assert_allclose(self.read_column(method_prefix + "-alpha-pertopic.csv"), alpha, rtol=1e-7)
+                nptest.assert_allclose(communityprior_pertopic.load_beta(method_prefix + "-beta-pertopic.npy"),
+                                       beta.toarray(), rtol=1e-6)
+
+class TestPriorStats(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_save(self):
+        priorstats.save_cover(self.dir, df_example, example_id_to_index)
+        alpha, beta = priorstats.estimate(priorstats.load(self.dir))
+        nptest.assert_array_equal(alpha, true_alpha)
+        nptest.assert_array_equal(beta, true_beta)
+
+    def apply_example_delta(self):
+        # Start from the first two communities, add the third and remove a row
+        base = df_example[df_example["community_id"] < 2]
+        added = df_example[df_example["community_id"] == 2]
+        removed = df_example.iloc[[0]]
+        priorstats.save_cover(self.dir, base, example_id_to_index)
+        stats = priorstats.load(self.dir, update=True)
+        self.assertTrue(isinstance(stats["beta_acc"], np.memmap))
+        delta = pd.concat([added, removed])
+        d_node, d_com, d_prob = communityprior.index_chunk(delta, communityprior.as_node_dict(example_id_to_index))
+        d_prob[-1] = -d_prob[-1]
+        priorstats.apply_delta(stats, d_node, d_com, d_prob, 4)
+        return stats
+
+    def check_estimate(self, rows):
+        alpha, beta = priorstats.estimate(priorstats.load(self.dir))
+        true_alpha, true_beta = communityprior.estimate_simple(rows, example_id_to_index)
+        nptest.assert_array_almost_equal(alpha, true_alpha, decimal=15)
+        nptest.assert_array_almost_equal(beta, true_beta, decimal=15)
+
+    def test_delta(self):
+        stats = self.apply_example_delta()
+        # Nothing is written before save_update
+        self.check_estimate(df_example[df_example["community_id"] < 2])
+        priorstats.save_update(self.dir, stats)
+        self.check_estimate(df_example.iloc[1:])
+
+    def test_interrupted_save(self):
+        stats = self.apply_example_delta()
+        replay = priorstats.replay
+        def crash(stats_dir):
+            raise KeyboardInterrupt()
+        priorstats.replay = crash
+        try:
+            self.assertRaises(KeyboardInterrupt, priorstats.save_update, self.dir, stats)
+        finally:
+            priorstats.replay = replay
+        self.assertTrue(os.path.exists(priorstats.journal_file(self.dir)))
+        # The next load completes the save
+        self.check_estimate(df_example.iloc[1:])
+        self.assertFalse(os.path.exists(priorstats.journal_file(self.dir)))
+
+    def test_partial_removal(self):
+        priorstats.save_cover(self.dir, df_example, example_id_to_index)
+        stats = priorstats.load(self.dir, update=True)
+        rows_before = stats["com_rows"].copy()
+        d_node, d_com, d_prob = communityprior.index_chunk(
+            df_example.iloc[[0]], communityprior.as_node_dict(example_id_to_index))
+        # Half the membership is removed, the node stays in the community
+        priorstats.apply_delta(stats, d_node, d_com, -0.5 * d_prob, 4)
+        nptest.assert_array_equal(stats["com_rows"], rows_before)
+        priorstats.save_update(self.dir, stats)
+        rows = df_example.copy()
+        rows.loc[0, "member_prob"] *= 0.5
+        self.check_estimate(rows)
+
+    def test_fold(self):
+        stats = self.apply_example_delta()
+        priorstats.fold(stats)
+        self.assertEqual(len(stats["delta_node"]), 0)
+        priorstats.save_update(self.dir, stats)
+        self.check_estimate(df_example.iloc[1:])
+        # Deltas after the fold see the folded cover
+        stats = priorstats.load(self.dir, update=True)
+        d_node, d_com, d_prob = communityprior.index_chunk(
+            df_example.iloc[[0]], communityprior.as_node_dict(example_id_to_index))
+        priorstats.apply_delta(stats, d_node, d_com, d_prob, 4, fold_rows=0)
+        self.assertEqual(len(stats["delta_node"]), 0)
+        priorstats.save_update(self.dir, stats)
+        self.check_estimate(df_example)
+
+    def test_bad_removal(self):
+        priorstats.save_cover(self.dir, df_example.iloc[1:], example_id_to_index)
+        stats = priorstats.load(self.dir, update=True)
+        lookup = communityprior.as_node_dict(example_id_to_index)
+        # The first row was never added, the second is removed twice
+        for rows in [df_example.iloc[[0]], df_example.iloc[[1, 1]]]:
+            d_node, d_com, d_prob = communityprior.index_chunk(rows, lookup)
+            self.assertRaises(ValueError, priorstats.apply_delta, stats, d_node, d_com, -d_prob, 4)
+        priorstats.save_update(self.dir, stats)
+        alpha, beta = priorstats.estimate(priorstats.load(self.dir))
+        true_alpha, true_beta = communityprior.estimate_simple(df_example.iloc[1:], example_id_to_index)
+        nptest.assert_array_equal(alpha, true_alpha)
+        nptest.assert_array_equal(beta, true_beta)
+
+class TestMLE(unittest.TestCase):
+
+    def test_recover(self):
+        true_alpha = np.array([2.0, 5.0, 3.0, 0.5])
+        p = np.random.RandomState(0).dirichlet(true_alpha, 20000)
+        alpha = dirichletmle.mle(spsparse.csr_matrix(p))
+        nptest.assert_allclose(alpha, true_alpha, rtol=0.05)
+        nptest.assert_array_almost_equal(alpha, dirichletmle.mle(p))
+
+    def test_mean_log_floor(self):
+        p = spsparse.csr_matrix(np.array([[0.5, 0.5, 0.0], [0.0, 0.0, 0.0], [0.25, 0.0, 0.75]]))
+        expected = np.log(np.maximum(np.array([[0.5, 0.5, 0.0], [0.25, 0.0, 0.75]]), 1e-10)).mean(axis=0)
+        nptest.assert_array_almost_equal(dirichletmle.mean_log(p, 1e-10), expected)
+
+    def test_example(self):
+        alpha, beta = communityprior.estimate_mle(df_example, example_id_to_index)
+        self.assertEqual(alpha.shape, (3,))
+        self.assertEqual(beta.shape, (4,))
+        self.assertTrue((alpha > 0).all() and (beta > 0).all())
+
+if __name__ == '__main__':
+    unittest.main()
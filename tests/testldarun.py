@@ -0,0 +1,223 @@
+import glob
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+import gensim
+import numpy as np
+import numpy.testing as nptest
+import pandas as pd
+import communityprior
+import communityprior_pertopic
+from corpus import builder
+from corpus import GraphCorpus
+import lda_run
+import membership
+
+# Two cliques joined by one edge
+edges = [(10, 11), (10, 12), (11, 12), (12, 13), (13, 14), (13, 15), (14, 15)]
+cover_csv = "node_id,community_id,member_prob\n10,0,1\n11,0,1\n12,0,1\n13,1,1\n14,1,1\n15,1,1\n"
+
+class TestPriors(unittest.TestCase):
+
+    def test_parse_prior(self):
+        self.assertEqual(lda_run.parse_prior('sym'), None)
+        self.assertEqual(lda_run.parse_prior('0.1'), 0.1)
+        self.assertEqual(lda_run.parse_prior('auto'), 'auto')
+
+    def test_double_prior(self):
+        alpha = lda_run.double_prior(np.array([1.0, 3.0]), 0.5, 0.5)
+        nptest.assert_allclose(alpha, [0.5, 1.5, 0.25, 0.25])
+
+    def test_double_pertopic(self):
+        beta = np.array([[0.2, 0.4, 0.6], [0.6, 0.4, 0.2]])
+        alpha, beta2, num_topics = lda_run.double_pertopic(np.array([1.0, 3.0]), beta, 2)
+        self.assertEqual(num_topics, 4)
+        nptest.assert_allclose(alpha, [0.5, 1.5, 0.25, 0.25])
+        nptest.assert_allclose(beta2, np.concatenate((0.5 * beta, 0.25 * np.ones((2, 3)))))
+
+    def test_double_pertopic_dtype(self):
+        beta = np.array([[0.2, 0.4, 0.6], [0.6, 0.4, 0.2]], dtype=np.float32)
+        alpha, beta2, num_topics = lda_run.double_pertopic(None, beta, 2)
+        self.assertEqual(beta2.dtype, np.float32)
+        nptest.assert_allclose(beta2, np.concatenate((0.5 * beta, 0.25 * np.ones((2, 3)))))
+
+    def test_double_pertopic_sym(self):
+        alpha, beta, num_topics = lda_run.double_pertopic(None, 0.1, 2)
+        self.assertEqual((alpha, beta, num_topics), (None, 0.1, 4))
+
+class TestSelect(unittest.TestCase):
+
+    def test_select(self):
+        probs = np.array([0.1, 0.5, 0.05, 0.3, 0.05], dtype=np.float32)
+        nptest.assert_array_equal(lda_run.select(probs), [0, 1, 2, 3, 4])
+        nptest.assert_array_equal(lda_run.select(probs, min_prob=0.1), [0, 1, 3])
+        nptest.assert_array_equal(lda_run.select(probs, mass=0.8), [1, 3])
+        nptest.assert_array_equal(lda_run.select(probs, mass=0.85), [0, 1, 3])
+        cutoffs = np.array([0.2, 0.5, 0.0, 0.4, 0.0], dtype=np.float32)
+        nptest.assert_array_equal(lda_run.select(probs, cutoffs, mass=0.9), [1])
+
+class TestRun(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        with open(self.path("edges.csv"), "wb") as f:
+            f.write("".join(["%d %d\n" % edge for edge in edges]))
+        builder.edges_to_corpus(self.path("edges.csv"), self.path("corpus.csv"), self.path("dict.csv"))
+        with open(self.path("cover.csv"), "wb") as f:
+            f.write(cover_csv)
+        com_data = pd.read_csv(self.path("cover.csv"))
+        id_to_index = communityprior.get_id_to_index(self.path("dict.csv"))
+        alpha, beta = communityprior.estimate_simple(com_data, id_to_index)
+        communityprior.write_alpha(self.path("louvain-alpha.csv"), alpha)
+        communityprior.write_beta(self.path("louvain-beta.csv"), beta)
+        alpha, beta = communityprior_pertopic.estimate_simple(com_data, id_to_index)
+        communityprior.write_alpha(self.path("louvain-alpha-pertopic.csv"), alpha)
+        communityprior_pertopic.write_beta_binary(self.path("louvain-beta-pertopic.npy"), beta)
+        config = {
+            "corpus_file": self.path("corpus.csv"),
+            "dict_file": self.path("dict.csv"),
+            "simple_out": self.path("simple-%d-%s-%s.csv"),
+            "simple_log": self.path("simple-%d-%s.log"),
+            "prior_alpha": self.path("%s-alpha.csv"),
+            "prior_beta": self.path("%s-beta.csv"),
+            "prior_out": self.path("hybrid-%s.csv"),
+            "prior_log": self.path("hybrid-%s.log"),
+            "prior_double_scale": 0.5,
+            "prior_double_alpha": 0.5,
+            "pertopic_alpha": self.path("%s-alpha-pertopic.csv"),
+            "pertopic_beta": self.path("%s-beta-pertopic.npy"),
+            "pertopic_out": self.path("hybrid-%s-%s-pertopic.csv"),
+            "pertopic_log": self.path("hybrid-%s-%s.log"),
+        }
+        with open(self.path("config.json"), "wb") as f:
+            json.dump(config, f)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def path(self, name):
+        return os.path.join(self.tmp, name)
+
+    def check_output(self, out_file, num_topics):
+        df = pd.read_csv(out_file)
+        self.assertEqual(len(df), 6 * num_topics)
+        self.assertEqual(sorted(set(df['node_id'])), [10, 11, 12, 13, 14, 15])
+        nptest.assert_allclose(df.groupby('community_id')['member_prob'].sum(), 1.0, rtol=1e-5)
+
+    def test_simple(self):
+        run = lda_run.main([self.path("config.json"), "simple", "3", "0.1", "sym"])
+        self.assertTrue(os.path.basename(run["out_file"]).startswith("simple-3-0.1-sym-"))
+        self.check_output(run["out_file"], 3)
+
+    def test_exit_status(self):
+        script = os.path.join(os.path.dirname(os.path.abspath(lda_run.__file__)), "lda_run.py")
+        for argv in [["simple", "2"], ["pertopic", "louvain", "single", "prior", "prior"]]:
+            with open(os.devnull, "wb") as devnull:
+                status = subprocess.call([sys.executable, script, self.path("config.json")] + argv,
+                                         stdout=devnull, cwd=os.path.dirname(script))
+            self.assertEqual(status, 0)
+
+    def test_prior_double(self):
+        run = lda_run.main([self.path("config.json"), "prior", "louvain", "double"])
+        self.assertEqual(run["out_file"], self.path("hybrid-louvain.csv"))
+        self.check_output(run["out_file"], 4)
+
+    def test_pertopic(self):
+        run = lda_run.main([self.path("config.json"), "pertopic", "louvain", "single", "prior", "prior"])
+        self.assertEqual(run["out_file"], self.path("hybrid-louvain-prior-prior-pertopic.csv"))
+        self.check_output(run["out_file"], 2)
+
+    def test_pertopic_text_beta(self):
+        # Priors saved before the binary format are read from the .csv name
+        beta = communityprior_pertopic.load_beta(self.path("louvain-beta-pertopic.npy"))
+        np.savetxt(self.path("louvain-beta-pertopic.csv"), beta)
+        os.remove(self.path("louvain-beta-pertopic.npy"))
+        run = lda_run.main([self.path("config.json"), "pertopic", "louvain", "single", "prior", "prior"])
+        self.check_output(run["out_file"], 2)
+
+    def test_write_topics(self):
+        # Same output as the show_topic loop of the original scripts
+        beta = communityprior_pertopic.load_beta(self.path("louvain-beta-pertopic.npy"))
+        ids = np.arange(10, 16)
+        for eta in [None, np.array(beta)]:
+            m = gensim.models.LdaModel(
+                GraphCorpus.GraphCorpus(self.path("corpus.csv")), id2word=gensim.utils.FakeDict(6),
+                num_topics=2, eta=eta, random_state=0)
+            expected = "node_id,community_id,member_prob\n"
+            for topic in range(2):
+                weights = dict([(int(x[0]), x[1]) for x in m.show_topic(topic, 6)])
+                for i in range(len(weights)):
+                    expected += "%d,%d,%s\n" % (ids[i], topic, repr(weights[i]))
+            lda_run.write_topics(m, ids, 2, 6, self.path("topics.csv"), block_entries=4)
+            with open(self.path("topics.csv"), "rb") as f:
+                self.assertEqual(f.read(), expected)
+
+    def test_top_k_binary(self):
+        run = lda_run.main([self.path("config.json"), "pertopic", "louvain", "single", "prior", "prior",
+                            "--top-k", "1", "--format", "both"])
+        self.assertEqual(run["binary_file"], self.path("hybrid-louvain-prior-prior-pertopic.npy"))
+        df = pd.read_csv(run["out_file"])
+        self.assertEqual(sorted(df["node_id"]), [10, 11, 12, 13, 14, 15])
+        binary = membership.read_memberships(run["binary_file"])
+        nptest.assert_array_equal(binary["node_id"], df["node_id"])
+        nptest.assert_array_equal(binary["community_id"], df["community_id"])
+        nptest.assert_array_equal(binary["member_prob"], df["member_prob"].astype(np.float32))
+
+    def test_sweep(self):
+        failed = lda_run.main([self.path("config.json"), "sweep", "louvain", "--alphas", "sym,prior",
+                               "--betas", "prior", "--processes", "2", "--memory-mb", "0.001"])
+        self.assertEqual(failed, [])
+        for priors, num_topics in [("sym-prior", 2), ("prior-prior", 2), ("sym-prior-double", 4),
+                                   ("prior-prior-double", 4)]:
+            self.check_output(self.path("hybrid-louvain-%s-pertopic.csv" % priors), num_topics)
+        self.assertEqual(lda_run.shared, {})
+
+    def test_sweep_runs(self):
+        args = lda_run.parse_args(["flickr", "sweep", "louvain", "--doubles", "double"])
+        runs = lda_run.sweep_runs(args, 10, 2**20)
+        self.assertEqual([(run.alpha, run.beta, run.suffix) for megabytes, run in runs],
+                         [("sym", "sym", ""), ("sym", "prior", ""), ("prior", "sym", ""), ("prior", "prior", "")])
+        self.assertEqual(runs[0][0], 16 * 20)
+
+    def test_checkpoint_resume(self):
+        plain = [self.path("config.json"), "pertopic", "louvain", "single", "prior", "prior",
+                 "--seed", "1", "--chunksize", "2"]
+        run = lda_run.main(plain)
+        with open(run["out_file"], "rb") as f:
+            expected = f.read()
+        argv = plain + ["--checkpoint-every", "1"]
+        lda_run.main(argv)
+        with open(run["out_file"], "rb") as f:
+            self.assertEqual(f.read(), expected)
+        self.assertEqual(lda_run.load_checkpoint(run["out_file"]), None)
+        # Interrupt the run in its third group of documents
+        do_mstep = gensim.models.LdaModel.do_mstep
+        calls = []
+        def interrupted(m, *args, **kwargs):
+            calls.append(1)
+            if len(calls) == 3:
+                raise KeyboardInterrupt()
+            return do_mstep(m, *args, **kwargs)
+        gensim.models.LdaModel.do_mstep = interrupted
+        try:
+            self.assertRaises(KeyboardInterrupt, lda_run.main, argv)
+        finally:
+            gensim.models.LdaModel.do_mstep = do_mstep
+        checkpoint = lda_run.load_checkpoint(run["out_file"])
+        self.assertEqual((checkpoint["docs"], checkpoint["generation"]), (4, 1))
+        self.assertEqual(len(glob.glob(self.path("*-checkpoint0.model*"))), 0)
+        lda_run.main(argv + ["--resume"])
+        with open(run["out_file"], "rb") as f:
+            self.assertEqual(f.read(), expected)
+        self.assertEqual(glob.glob(self.path("*-checkpoint*")), [])
+
+    def test_pertopic_multicore(self):
+        run = lda_run.main([self.path("config.json"), "pertopic", "louvain", "double", "sym", "prior", "--workers", "2"])
+        self.check_output(run["out_file"], 4)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy.testing as nptest
+import nodedict
+
+dict_csv = "node_index,node_id\n0,3\n1,10\n2,42\n3,1000\n"
+
+class TestNodeDict(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.dict_file = os.path.join(self.dir, "dict.csv")
+        with open(self.dict_file, "wb") as f:
+            f.write(dict_csv)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_lookup(self):
+        d = nodedict.load(self.dict_file)
+        self.assertEqual(len(d), 4)
+        nptest.assert_array_equal(d.index([42, 3, 7, 1000]), [2, 0, -1, 3])
+        nptest.assert_array_equal(d.id([3, 1]), [1000, 10])
+        self.assertEqual(d[10], 1)
+        self.assertRaises(KeyError, d.__getitem__, 11)
+
+    def test_unsorted(self):
+        d = nodedict.NodeDict([5, 2, 9])
+        nptest.assert_array_equal(d.index([2, 9, 5, 4]), [1, 2, 0, -1])
+
+    def test_from_mapping(self):
+        d = nodedict.from_mapping({5: 0, 2: 1, 9: 2})
+        nptest.assert_array_equal(d.ids, [5, 2, 9])
+
+    def test_cache(self):
+        nodedict.load(self.dict_file)
+        self.assertTrue(os.path.exists(nodedict.cache_file(self.dict_file)))
+        nptest.assert_array_equal(nodedict.load(self.dict_file).ids, [3, 10, 42, 1000])
+
+    def test_stale_cache(self):
+        nodedict.load(self.dict_file)
+        mtime = os.path.getmtime(self.dict_file)
+        # Rewritten with the same mtime, as by cp -p of another dictionary
+        with open(self.dict_file, "ab") as f:
+            f.write("4,2000\n")
+        os.utime(self.dict_file, (mtime, mtime))
+        nptest.assert_array_equal(nodedict.load(self.dict_file).ids, [3, 10, 42, 1000, 2000])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,32 @@
+import argparse
+import communityprior
+import priorstats
+
+# Update flat priors from statistics saved with communityprior.py --save-stats.
+# The delta csv has node_id,community_id,member_prob rows and an optional
+# action column; rows with action "remove" are taken out of the cover.
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Update SSN-LDA priors with a delta of community memberships")
+    parser.add_argument("stats_dir", help="directory written by communityprior.py --save-stats")
+    parser.add_argument("delta_file", help="csv of node_id,community_id,member_prob[,action]")
+    parser.add_argument("dict_file", help="csv of node_index,node_id")
+    parser.add_argument("alpha_file")
+    parser.add_argument("beta_file")
+    args = parser.parse_args()
+
+    # Load data
+    id_to_index = communityprior.get_id_to_index(args.dict_file)
+    stats = priorstats.load(args.stats_dir, update=True)
+    d_node, d_com, d_prob = priorstats.read_delta(args.delta_file, id_to_index)
+    print "Applying %d delta rows" % len(d_node)
+
+    # Update and save statistics, the base cover is unchanged
+    priorstats.apply_delta(stats, d_node, d_com, d_prob, len(id_to_index))
+    priorstats.save_update(args.stats_dir, stats)
+
+    # Write output
+    alpha, beta = priorstats.estimate(stats)
+    print "Estimated %d nodes and %d communities" % (len(beta), len(alpha))
+    communityprior.write_alpha(args.alpha_file, alpha)
+    communityprior.write_beta(args.beta_file, beta)